@@ -0,0 +1,30 @@
+import statistics
+
+
+def percentiles(samples: list[float]) -> dict:
+    """Перцентили задержек в миллисекундах"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {"count": len(ordered), "p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99),
+            "mean_ms": round(statistics.fmean(ordered) * 1000, 3)}
+
+
+def parse_metrics(text: str) -> dict[tuple[str, tuple], float]:
+    """Разбор текстового формата Prometheus: (имя, метки) -> значение"""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        series, _, value = line.rpartition(" ")
+        name, _, labels = series.partition("{")
+        pairs = []
+        for item in labels.rstrip("}").split('",') if labels else ():
+            key, _, raw = item.partition("=")
+            pairs.append((key, raw.strip('"')))
+        samples[(name, tuple(pairs))] = float(value)
+    return samples
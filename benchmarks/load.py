@@ -0,0 +1,270 @@
+"""Нагрузочный тест API по данным из benchmarks.seed.
+
+Запуск против работающего сервера:
+
+    python -m benchmarks.load --seed-file bench_seed.json --duration 30 --concurrency 32 \
+        --save-baseline bench_baseline.json
+    python -m benchmarks.load --seed-file bench_seed.json --duration 30 --concurrency 32 \
+        --baseline bench_baseline.json --max-regression 10
+
+Каждый из --concurrency клиентов в цикле выбирает пользователя и операцию по весам
+--mix (например, list=40,get=20,create=5) и выполняет ее. По каждой операции считаются
+перцентили задержки, RPS и ошибки. SQL-запросы на HTTP-запрос и RSS берутся из разницы
+/metrics до и после прогона (нужен --metrics-token: METRICS_TOKEN сервера или токен
+администратора); при нескольких воркерах uvicorn /metrics отвечает один из них,
+поэтому эти цифры точны только для --workers 1.
+
+С --baseline результат сравнивается с сохраненным прогоном, а с --max-regression
+скрипт завершается с ошибкой, если p95 какой-то операции вырос больше чем на столько процентов.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import uuid
+
+import httpx
+
+from benchmarks.common import percentiles, parse_metrics
+
+
+async def op_list(client, user, rng):
+    return await client.get("/api/notes/", params={"limit": 50}, headers=user["auth"])
+
+
+async def op_archives(client, user, rng):
+    return await client.get("/api/notes/archives", params={"limit": 50}, headers=user["auth"])
+
+
+async def op_get(client, user, rng):
+    return await client.get(f"/api/notes/{rng.choice(user['note_ids'])}", headers=user["auth"])
+
+
+async def op_search(client, user, rng):
+    return await client.get("/api/notes/search", params={"q": rng.choice(["план", "review", "проект"])},
+                            headers=user["auth"])
+
+
+async def op_changes(client, user, rng):
+    params = {"since": user["watermark"]} if user.get("watermark") else {}
+    response = await client.get("/api/notes/changes", params=params, headers=user["auth"])
+    if response.status_code == 200:
+        user["watermark"] = response.json()["watermark"]
+    return response
+
+
+async def op_create(client, user, rng):
+    response = await client.post("/api/notes/", json={
+        "title": f"load {uuid.uuid4().hex[:8]}", "description": "x" * rng.randint(50, 500),
+        "noteTags": rng.sample(user["tags"], min(2, len(user["tags"]))),
+    }, headers=user["auth"])
+    if response.status_code == 201:
+        user["note_ids"].append(response.json()["note_id"])
+    return response
+
+
+async def op_update(client, user, rng):
+    return await client.put(f"/api/notes/{rng.choice(user['note_ids'])}", json={
+        "title": f"load {uuid.uuid4().hex[:8]}", "description": "y" * rng.randint(50, 500),
+        "tags": rng.sample(user["tags"], min(2, len(user["tags"]))),
+    }, headers=user["auth"])
+
+
+async def op_archive(client, user, rng):
+    return await client.patch(f"/api/notes/archive/add/{rng.choice(user['note_ids'])}", headers=user["auth"])
+
+
+async def op_unarchive(client, user, rng):
+    return await client.patch(f"/api/notes/archive/remove/{rng.choice(user['note_ids'])}", headers=user["auth"])
+
+
+async def op_export(client, user, rng):
+    return await client.get("/api/notes/export/csv", headers={**user["auth"], "Accept-Encoding": "gzip"})
+
+
+async def op_export_excel(client, user, rng):
+    return await client.get("/api/notes/export/excel", headers=user["auth"])
+
+
+async def op_tags(client, user, rng):
+    return await client.get("/api/tags/")
+
+
+async def op_profile(client, user, rng):
+    return await client.get("/api/users/profile", headers=user["auth"])
+
+
+async def op_login(client, user, rng):
+    return await client.post("/api/users/login", json={"email": user["email"], "password": user["password"]})
+
+
+# Операция -> (функция, метод и шаблон маршрута в /metrics)
+OPERATIONS = {
+    "list": (op_list, "GET", "/api/notes/"),
+    "archives": (op_archives, "GET", "/api/notes/archives"),
+    "get": (op_get, "GET", "/api/notes/{id}"),
+    "search": (op_search, "GET", "/api/notes/search"),
+    "changes": (op_changes, "GET", "/api/notes/changes"),
+    "create": (op_create, "POST", "/api/notes/"),
+    "update": (op_update, "PUT", "/api/notes/{note_id}"),
+    "archive": (op_archive, "PATCH", "/api/notes/archive/add/{note_id}"),
+    "unarchive": (op_unarchive, "PATCH", "/api/notes/archive/remove/{note_id}"),
+    "export": (op_export, "GET", "/api/notes/export/{fmt}"),
+    "export_excel": (op_export_excel, "GET", "/api/notes/export/excel"),
+    "tags": (op_tags, "GET", "/api/tags/"),
+    "profile": (op_profile, "GET", "/api/users/profile"),
+    "login": (op_login, "POST", "/api/users/login"),
+}
+DEFAULT_MIX = "list=30,archives=5,get=20,search=5,changes=10,create=5,update=5,archive=1,unarchive=1,export=1,tags=10,profile=5,login=2"
+
+
+def parse_mix(mix: str) -> dict[str, int]:
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in OPERATIONS:
+            raise SystemExit(f"Неизвестная операция: {name}")
+        weights[name.strip()] = int(weight or 1)
+    return weights
+
+
+async def worker(client, users, weights, deadline, requests_left, results, rng):
+    names, name_weights = list(weights), list(weights.values())
+    while time.perf_counter() < deadline:
+        if requests_left is not None:
+            if requests_left[0] <= 0:
+                return
+            requests_left[0] -= 1
+        name = rng.choices(names, name_weights)[0]
+        user = rng.choice(users)
+        started = time.perf_counter()
+        try:
+            response = await OPERATIONS[name][0](client, user, rng)
+            await response.aread()
+            status = response.status_code
+        except httpx.HTTPError:
+            status = 0
+        elapsed = time.perf_counter() - started
+        result = results.setdefault(name, {"samples": [], "statuses": {}})
+        result["samples"].append(elapsed)
+        result["statuses"][status] = result["statuses"].get(status, 0) + 1
+
+
+def db_statements_per_request(before: dict, after: dict) -> dict[tuple[str, str], float]:
+    totals = {}
+    for (name, labels), value in after.items():
+        if name not in ("http_request_db_statements_sum", "http_request_db_statements_count"):
+            continue
+        labels_map = dict(labels)
+        key = (labels_map.get("method"), labels_map.get("route"))
+        delta = value - before.get((name, labels), 0)
+        totals.setdefault(key, [0.0, 0.0])[name.endswith("_count")] += delta
+    return {key: round(total / count, 2) for key, (total, count) in totals.items() if count}
+
+
+async def scrape(client, token: str | None) -> dict:
+    if token is None:
+        return {}
+    try:
+        response = await client.get("/metrics", headers={"Authorization": f"Bearer {token}"})
+        return parse_metrics(response.text) if response.status_code == 200 else {}
+    except httpx.HTTPError:
+        return {}
+
+
+def compare(report: dict, baseline: dict) -> dict:
+    comparison = {}
+    for name, current in report["operations"].items():
+        previous = baseline.get("operations", {}).get(name)
+        if not previous or not previous.get("p95_ms") or not current.get("p95_ms"):
+            continue
+        comparison[name] = {
+            "p95_change_pct": round((current["p95_ms"] / previous["p95_ms"] - 1) * 100, 1),
+            "rps_change_pct": round((current["rps"] / previous["rps"] - 1) * 100, 1) if previous["rps"] else None,
+        }
+    return comparison
+
+
+async def main(args) -> int:
+    with open(args.seed_file) as file:
+        seed = json.load(file)
+    users = [
+        {**user, "password": seed["password"], "tags": seed["tag_ids"],
+         "auth": {"Authorization": f"Bearer {user['token']}"}}
+        for user in seed["users"]
+    ]
+    weights = parse_mix(args.mix)
+    rng = random.Random(args.seed)
+    results: dict[str, dict] = {}
+
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60, limits=limits) as client:
+        metrics_before = await scrape(client, args.metrics_token)
+        started = time.perf_counter()
+        deadline = started + args.duration if args.requests is None else float("inf")
+        requests_left = [args.requests] if args.requests is not None else None
+        await asyncio.gather(*(
+            worker(client, users, weights, deadline, requests_left, results, random.Random(rng.random()))
+            for _ in range(args.concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+        metrics_after = await scrape(client, args.metrics_token)
+
+    queries = db_statements_per_request(metrics_before, metrics_after)
+    operations = {}
+    for name, result in sorted(results.items()):
+        _, method, route = OPERATIONS[name]
+        errors = sum(count for status, count in result["statuses"].items() if status == 0 or status >= 400)
+        operations[name] = {
+            **percentiles(result["samples"]),
+            "rps": round(len(result["samples"]) / elapsed, 1),
+            "errors": errors,
+            "statuses": {str(status): count for status, count in result["statuses"].items()},
+            "db_queries_per_request": queries.get((method, route)),
+        }
+    all_samples = [sample for result in results.values() for sample in result["samples"]]
+    rss = metrics_after.get(("process_resident_memory_bytes", ()))
+    report = {
+        "config": {"base_url": args.base_url, "concurrency": args.concurrency, "duration": round(elapsed, 3),
+                   "mix": weights, "users": len(users), "seed": args.seed},
+        "total": {**percentiles(all_samples), "rps": round(len(all_samples) / elapsed, 1)},
+        "operations": operations,
+        "worker_rss_bytes": int(rss) if rss is not None else None,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as file:
+            report["comparison"] = compare(report, json.load(file))
+        if args.max_regression is not None:
+            regressed = [name for name, change in report["comparison"].items()
+                         if change["p95_change_pct"] > args.max_regression]
+            if regressed:
+                report["regressed"] = regressed
+                exit_code = 1
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as file:
+            json.dump(report, file, indent=2)
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return exit_code
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--seed-file", default="bench_seed.json")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--requests", type=int, help="вместо --duration: общее число запросов")
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--metrics-token", default=os.environ.get("METRICS_TOKEN"),
+                        help="токен для /metrics, по умолчанию из переменной METRICS_TOKEN")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--save-baseline", help="сохранить этот прогон как JSON")
+    parser.add_argument("--max-regression", type=float, help="допустимый рост p95, процентов")
+    sys.exit(asyncio.run(main(parser.parse_args())))
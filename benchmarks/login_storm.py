@@ -0,0 +1,81 @@
+"""Задержка /api/ping/ во время шторма логинов.
+
+Запуск против работающего сервера:
+
+    python -m benchmarks.login_storm --base-url http://localhost:8000 --logins 200 --concurrency 50
+
+Сначала регистрируется одноразовый пользователь, затем /api/ping/ замеряется без нагрузки
+и параллельно с потоком логинов. Если argon2 блокирует event loop, перцентили ping
+во время шторма вырастут до десятков миллисекунд; с пулом хэширования они остаются
+на уровне холостого хода.
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+import httpx
+
+from benchmarks.common import percentiles
+
+
+async def ping_loop(client: httpx.AsyncClient, stop: asyncio.Event, interval: float) -> list[float]:
+    samples = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get("/api/ping/")
+        samples.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+    return samples
+
+
+async def login_storm(client: httpx.AsyncClient, credentials: dict, logins: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses: dict[int, int] = {}
+
+    async def one():
+        async with semaphore:
+            response = await client.post("/api/users/login", json=credentials)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(logins)))
+    return {"seconds": round(time.perf_counter() - started, 3), "statuses": statuses}
+
+
+async def main(base_url: str, logins: int, concurrency: int, idle_seconds: float, interval: float):
+    credentials = {"email": f"storm-{uuid.uuid4().hex[:12]}@example.com", "password": uuid.uuid4().hex}
+    limits = httpx.Limits(max_connections=concurrency + 1)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        response = await client.post("/api/users/", json={"name": "storm", "last_name": None, **credentials})
+        response.raise_for_status()
+
+        stop = asyncio.Event()
+        idle = asyncio.create_task(ping_loop(client, stop, interval))
+        await asyncio.sleep(idle_seconds)
+        stop.set()
+        idle_samples = await idle
+
+        stop = asyncio.Event()
+        during = asyncio.create_task(ping_loop(client, stop, interval))
+        storm = await login_storm(client, credentials, logins, concurrency)
+        stop.set()
+        storm_samples = await during
+
+    print(json.dumps({
+        "ping_idle": percentiles(idle_samples),
+        "ping_during_storm": percentiles(storm_samples),
+        "logins": storm,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--idle-seconds", type=float, default=3)
+    parser.add_argument("--interval", type=float, default=0.01)
+    args = parser.parse_args()
+    asyncio.run(main(args.base_url, args.logins, args.concurrency, args.idle_seconds, args.interval))
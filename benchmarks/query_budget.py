@@ -0,0 +1,162 @@
+"""Бюджеты SQL-запросов для сервисных функций: защита от N+1.
+
+Запуск (нужна база из .env с примененными миграциями):
+
+    python -m benchmarks.query_budget --sizes 10 1000
+
+Для каждого размера создается временный пользователь с заметками (benchmarks.seed),
+и каждая сервисная функция выполняется в своей единице работы, как в обработчике
+маршрута, под count_queries(). Проверяется, что число запросов не больше бюджета
+и не зависит от числа заметок. Нарушения печатаются в JSON, код выхода - 1.
+
+Те же замеры проверяет tests/test_query_budget.py.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+
+from fastapi import Response
+
+from benchmarks.seed import seed, cleanup
+from database.database import engine, unit_of_work
+from database.instrumentation import count_queries, instrument_engine
+from dto.note_dto import NoteCreateRequest, NoteUpdateRequest, NoteBatchRequest
+from services import note as note_service, tag as tag_service, user as user_service
+from services.note import NoteTagsCRUD
+from services.tag import TagCRUD, tag_registry
+
+# Запросов на вызов, без BEGIN/COMMIT; справочник тегов загружен заранее, кэш ответов пуст
+BUDGETS = {
+    "get_all_my": 3,          # ревизия пользователя, страница заметок, связи с тегами
+    "get_all_my_archives": 3,
+    "get_by_id": 3,           # версия заметки, заметка, связи с тегами
+    "search": 2,              # страница с фрагментами, связи с тегами
+    "get_changes": 2,         # UNION ALL заметок и следов удаления, связи с тегами
+    "create_note": 3,         # ревизия, заметка, все связи одним INSERT
+    "update_note": 5,         # ревизия, UPDATE ... RETURNING, текущие теги, удаление и вставка связей
+    "archive_add_by_id": 3,   # владелец, ревизия, UPDATE
+    "delete_by_id": 4,        # владелец, ревизия, DELETE, след удаления
+    "apply_batch": 10,        # по одному запросу на вид операции, сколько бы операций ни было
+    "remove_tag": 6,          # проверка тега, порция (DELETE, ревизии, заметки), добор и удаление тега
+    "get_tags": 0,            # справочник в памяти
+    "get_profile": 1,
+}
+
+REMOVE_TAG_NOTES = 10
+
+
+def batch_request(note_ids: list[int], tag_ids: list[int], size: int) -> NoteBatchRequest:
+    # При любом размере заняты все виды операций - иначе число запросов зависело бы от размера
+    count = max(1, min(size // 4, 100))
+    operations = []
+    for i in range(count):
+        operations.append({"op": "create", "title": f"batch {i}", "description": "x", "tags": tag_ids[:2]})
+    for note_id in note_ids[:count]:
+        operations.append({"op": "update", "note_id": note_id, "title": "batch", "description": "y",
+                           "tags": tag_ids[1:3]})
+    for note_id in note_ids[count:2 * count]:
+        operations.append({"op": "archive", "note_id": note_id})
+    for note_id in note_ids[2 * count:3 * count]:
+        operations.append({"op": "delete", "note_id": note_id})
+    return NoteBatchRequest(operations=operations[:500])
+
+
+async def prepare_tag(user_id: int, note_ids: list[int]) -> int:
+    async with unit_of_work():
+        tag_id = await TagCRUD.create_and_return_id(name=f"budget-{user_id}", color="#000000")
+    async with unit_of_work() as session:
+        await NoteTagsCRUD.insert_links(session, [(note_id, tag_id) for note_id in note_ids])
+    tag_registry.invalidate()
+    await tag_registry.get()
+    return tag_id
+
+
+def scenarios(user_id: int, note_ids: list[int], tag_ids: list[int], size: int):
+    """(имя, только чтение, фабрика корутины); заметки для изменяющих вызовов не пересекаются"""
+    ids = list(note_ids)
+    read_id, update_id, archive_id, delete_id = ids.pop(), ids.pop(), ids.pop(), ids.pop()
+    return [
+        ("get_all_my", True, lambda: note_service.get_all_my(user_id, 50)),
+        ("get_all_my_archives", True, lambda: note_service.get_all_my_archives(user_id, 50)),
+        ("get_by_id", True, lambda: note_service.get_by_id(read_id, user_id)),
+        ("search", True, lambda: note_service.search(user_id, "план", 50)),
+        ("get_changes", True, lambda: note_service.get_changes(user_id, 200)),
+        ("get_tags", True, lambda: tag_service.get_all(Response())),
+        ("get_profile", True, lambda: user_service.get_profile(user_id)),
+        ("create_note", False, lambda: note_service.create_note(
+            NoteCreateRequest(title="budget", description="x", noteTags=tag_ids[:3]), user_id)),
+        ("update_note", False, lambda: note_service.update_note(
+            update_id, NoteUpdateRequest(title="budget", description="y", tags=tag_ids[2:5]), user_id)),
+        ("archive_add_by_id", False, lambda: note_service.archive_add_by_id(archive_id, user_id)),
+        ("delete_by_id", False, lambda: note_service.delete_by_id(delete_id, user_id)),
+        ("apply_batch", False, lambda: note_service.apply_batch(user_id, batch_request(ids, tag_ids, size))),
+    ]
+
+
+async def measure(name: str, read_only: bool, factory) -> dict:
+    with count_queries() as queries:
+        async with unit_of_work(read_only=read_only):
+            await factory()
+    return queries.as_dict()
+
+
+async def run_size(size: int, rng: random.Random) -> tuple[dict, dict]:
+    data = await seed(users=1, notes_per_user=max(size, 4) + 4 + REMOVE_TAG_NOTES, tags_per_note=3,
+                      archived_share=0.2, description_words=20, rng=rng)
+    user = data["users"][0]
+    # Заметки для remove_tag отделены от остальных сценариев: apply_batch часть заметок удаляет
+    scenario_ids, tag_note_ids = user["note_ids"][:-REMOVE_TAG_NOTES], user["note_ids"][-REMOVE_TAG_NOTES:]
+    try:
+        await tag_registry.load()
+        results = {}
+        for name, read_only, factory in scenarios(user["id"], scenario_ids, data["tag_ids"], size):
+            results[name] = await measure(name, read_only, factory)
+        # Связей меньше порции TAG_DELETE_BATCH_SIZE: больше порций - больше запросов, это ожидаемо
+        tag_id = await prepare_tag(user["id"], tag_note_ids)
+        results["remove_tag"] = await measure("remove_tag", False, lambda: tag_service.remove_tag(tag_id))
+        return results, data
+    finally:
+        await cleanup(data)
+
+
+async def collect(sizes: list[int], seed_value: int) -> dict[int, dict]:
+    """Замеры всех сервисных функций для каждого размера; соединения закрываются в конце"""
+    instrument_engine(engine)
+    rng = random.Random(seed_value)
+    by_size = {}
+    try:
+        for size in sizes:
+            by_size[size], _ = await run_size(size, rng)
+    finally:
+        await engine.dispose()
+    return by_size
+
+
+def find_violations(by_size: dict[int, dict]) -> list[dict]:
+    violations = []
+    for name, budget in BUDGETS.items():
+        counts = {size: results[name]["statements"] for size, results in by_size.items() if name in results}
+        if any(count > budget for count in counts.values()):
+            violations.append({"name": name, "budget": budget, "statements": counts})
+        elif len(set(counts.values())) > 1:
+            violations.append({"name": name, "budget": budget, "statements": counts,
+                               "detail": "число запросов зависит от числа заметок"})
+    return violations
+
+
+async def main(sizes: list[int], seed_value: int) -> int:
+    by_size = await collect(sizes, seed_value)
+    violations = find_violations(by_size)
+    print(json.dumps({"budgets": BUDGETS, "results": by_size, "violations": violations}, indent=2,
+                     ensure_ascii=False))
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000])
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.sizes, args.seed)))
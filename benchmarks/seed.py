@@ -0,0 +1,130 @@
+"""Наполнение базы данными для нагрузочного теста benchmarks.load.
+
+Запуск (нужна база из .env с примененными миграциями; локально подойдет сервис db
+из docker-compose.yml: docker compose up -d db && alembic upgrade head):
+
+    python -m benchmarks.seed --users 50 --notes-per-user 2000 --tags-per-note 3 --output bench_seed.json
+    python -m benchmarks.seed --cleanup bench_seed.json
+
+Пользователи, заметки и связи вставляются многострочными INSERT напрямую в базу,
+у всех пользователей один пароль (хэш считается один раз). В файл пишутся email,
+пароль, токен и id заметок каждого пользователя - load.py берет их оттуда.
+Генератор случайных чисел инициализируется --seed, поэтому данные воспроизводимы.
+"""
+import argparse
+import asyncio
+import json
+import random
+import uuid
+
+from sqlalchemy import insert, delete, select
+
+from database.database import async_session_maker, engine
+from models.notes import Note, NotesTags, Tag
+from models.users import User
+from security import create_perpetual_token, hash_password
+
+SEED_CHUNK = 5000
+WORDS = ["план", "встреча", "идея", "отчет", "покупки", "книга", "проект", "задача", "звонок", "поездка",
+         "meeting", "draft", "review", "release", "budget", "notes", "travel", "research"]
+
+
+def make_text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+async def ensure_tags(session, count: int, run: str) -> list[int]:
+    tag_ids = list((await session.execute(select(Tag.id).order_by(Tag.id))).scalars())
+    if len(tag_ids) >= count:
+        return tag_ids
+    created = (await session.execute(
+        insert(Tag).returning(Tag.id),
+        [{"name": f"bench-{run}-{i}", "color": "#4682B4"} for i in range(count - len(tag_ids))],
+    )).scalars().all()
+    return tag_ids + list(created)
+
+
+async def seed(users: int, notes_per_user: int, tags_per_note: int, archived_share: float,
+               description_words: int, rng: random.Random) -> dict:
+    run = uuid.uuid4().hex[:8]
+    password = uuid.uuid4().hex
+    password_hash = hash_password(password)
+    result = {"run": run, "password": password, "users": [], "tag_ids": [], "created_tags": []}
+
+    async with async_session_maker() as session:
+        tag_ids = await ensure_tags(session, max(tags_per_note * 4, 10), run)
+        result["tag_ids"] = tag_ids
+        result["created_tags"] = (await session.execute(
+            select(Tag.id).where(Tag.name.like(f"bench-{run}-%"))
+        )).scalars().all()
+
+        for index in range(users):
+            email = f"bench-{run}-{index}@example.com"
+            user_id = (await session.execute(
+                insert(User).values(name="bench", last_name=str(index), email=email, password_hash=password_hash,
+                                    notes_revision=1).returning(User.id)
+            )).scalar_one()
+            note_ids = []
+            for offset in range(0, notes_per_user, SEED_CHUNK):
+                size = min(SEED_CHUNK, notes_per_user - offset)
+                chunk = (await session.execute(
+                    insert(Note).returning(Note.id, sort_by_parameter_order=True),
+                    [
+                        {"user_id": user_id, "title": make_text(rng, 4),
+                         "description": make_text(rng, description_words),
+                         "is_archive": rng.random() < archived_share, "revision": 1}
+                        for _ in range(size)
+                    ],
+                )).scalars().all()
+                links = [
+                    {"note_id": note_id, "tag_id": tag_id}
+                    for note_id in chunk for tag_id in rng.sample(tag_ids, min(tags_per_note, len(tag_ids)))
+                ]
+                if links:
+                    await session.execute(insert(NotesTags), links)
+                note_ids.extend(chunk)
+            result["users"].append({
+                "id": user_id,
+                "email": email,
+                "token": create_perpetual_token({"sub": str(user_id)}),
+                "note_ids": note_ids,
+            })
+        await session.commit()
+    return result
+
+
+async def cleanup(data: dict):
+    async with async_session_maker() as session:
+        # Заметки, связи и следы удаления уходят каскадно вместе с пользователями
+        await session.execute(delete(User).where(User.id.in_([user["id"] for user in data["users"]])))
+        if data["created_tags"]:
+            await session.execute(delete(Tag).where(Tag.id.in_(data["created_tags"])))
+        await session.commit()
+
+
+async def main(args):
+    try:
+        if args.cleanup:
+            with open(args.cleanup) as file:
+                await cleanup(json.load(file))
+            return
+        data = await seed(args.users, args.notes_per_user, args.tags_per_note, args.archived_share,
+                          args.description_words, random.Random(args.seed))
+        with open(args.output, "w") as file:
+            json.dump(data, file)
+        print(json.dumps({"run": data["run"], "users": len(data["users"]), "output": args.output}))
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--notes-per-user", type=int, default=1000)
+    parser.add_argument("--tags-per-note", type=int, default=3)
+    parser.add_argument("--archived-share", type=float, default=0.2)
+    parser.add_argument("--description-words", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="bench_seed.json")
+    parser.add_argument("--cleanup", metavar="SEED_FILE", help="удалить данные, созданные прошлым запуском")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,100 @@
+"""Сравнение сериализации списка заметок: модели pydantic против словарей и orjson.
+
+Запуск (база не нужна, строки генерируются в памяти):
+
+    python -m benchmarks.serialization --sizes 1000 50000 --tags-per-note 3
+
+Прежний путь повторяет то, что делал FastAPI: сервис строит NoteSummaryResponse с вложенными
+TagResponse, затем ответ еще раз валидируется по response_model, превращается в
+JSON-совместимые словари и кодируется json.dumps. Новый путь - note_summary_to_dict и
+orjson.dumps, как в services.note. Вывод - JSON с лучшим временем каждого пути и
+размером тела; тела обоих путей сверяются как разобранный JSON.
+"""
+import argparse
+import json
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+import orjson
+from pydantic import TypeAdapter
+
+from dto.note_dto import NoteSummaryResponse, PageResponse, TagResponse
+from models.notes import NOTE_PREVIEW_LENGTH
+from services.serialization import note_summary_to_dict, JSON_OPTIONS
+
+NoteRow = namedtuple(
+    "NoteRow", "id title user_id description_preview description_length is_archive created_at updated_at"
+)
+DESCRIPTION = "Описание заметки " * 12
+
+
+def make_rows(size: int, tags_per_note: int, tag_count: int):
+    started = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    rows = [
+        NoteRow(i, f"Заметка {i}", 1, DESCRIPTION[:NOTE_PREVIEW_LENGTH], len(DESCRIPTION), False,
+                started + timedelta(seconds=i), started + timedelta(seconds=i, microseconds=i % 1000))
+        for i in range(size)
+    ]
+    tags = {i: {"id": i, "name": f"Тег {i}", "color": "#4682B4"} for i in range(tag_count)}
+    links = {row.id: [(row.id + k) % tag_count for k in range(tags_per_note)] for row in rows}
+    return rows, tags, links
+
+
+def pydantic_path(rows, tags: dict[int, dict], links: dict[int, list[int]], adapter: TypeAdapter) -> bytes:
+    tag_models = {tag_id: TagResponse(**tag) for tag_id, tag in tags.items()}
+    page = PageResponse[NoteSummaryResponse](
+        items=[
+            NoteSummaryResponse(**row._asdict(), tags=[tag_models[tag_id] for tag_id in links[row.id]])
+            for row in rows
+        ],
+        next_cursor=None,
+    )
+    # Повторная валидация и сериализация по response_model, затем JSONResponse.render
+    content = adapter.dump_python(adapter.validate_python(page, from_attributes=True), mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def orjson_path(rows, tags: dict[int, dict], links: dict[int, list[int]]) -> bytes:
+    return orjson.dumps(
+        {"items": [note_summary_to_dict(row, [tags[tag_id] for tag_id in links[row.id]]) for row in rows],
+         "next_cursor": None},
+        option=JSON_OPTIONS,
+    )
+
+
+def timed(fn, repeat: int) -> tuple[float, bytes]:
+    best, body = float("inf"), b""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, body
+
+
+def main(sizes: list[int], tags_per_note: int, repeat: int):
+    adapter = TypeAdapter(PageResponse[NoteSummaryResponse])
+    results = []
+    for size in sizes:
+        rows, tags, links = make_rows(size, tags_per_note, tag_count=max(tags_per_note, 1) * 7)
+        pydantic_seconds, pydantic_body = timed(lambda: pydantic_path(rows, tags, links, adapter), repeat)
+        orjson_seconds, orjson_body = timed(lambda: orjson_path(rows, tags, links), repeat)
+        if json.loads(pydantic_body) != json.loads(orjson_body):
+            raise SystemExit(f"Ответы различаются при {size} заметках")
+        results.append({
+            "notes": size,
+            "tags_per_note": tags_per_note,
+            "pydantic": {"seconds": pydantic_seconds, "bytes": len(pydantic_body)},
+            "orjson": {"seconds": orjson_seconds, "bytes": len(orjson_body)},
+            "speedup": round(pydantic_seconds / orjson_seconds, 1),
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 50000])
+    parser.add_argument("--tags-per-note", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    main(args.sizes, args.tags_per_note, args.repeat)
@@ -0,0 +1,134 @@
+"""Сравнение загрузки тегов: joinedload против двухфазного загрузчика NoteCRUD.
+
+Запуск (нужна база из .env с примененными миграциями):
+
+    python -m benchmarks.tag_loader --sizes 10 1000 50000 --tags-per-note 3
+
+Для каждого размера создается временный пользователь с заметками, после замеров он
+удаляется вместе с заметками (ON DELETE CASCADE). Вывод - JSON с объемом результата
+запросов в байтах и временем загрузки для обоих путей.
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from sqlalchemy import select, insert, delete, event
+from sqlalchemy.orm import joinedload
+
+from database.database import async_session_maker, engine
+from models.notes import Note, NotesTags, Tag
+from models.users import User
+from services.note import NoteCRUD
+
+SEED_CHUNK = 5000
+
+
+async def seed(notes_count: int, tags_per_note: int, tag_ids: list[int]) -> int:
+    async with async_session_maker() as session:
+        user_id = (await session.execute(
+            insert(User).values(name="bench", email=f"bench-{uuid.uuid4().hex}@example.com",
+                                password_hash="-").returning(User.id)
+        )).scalar_one()
+        for offset in range(0, notes_count, SEED_CHUNK):
+            size = min(SEED_CHUNK, notes_count - offset)
+            note_ids = (await session.execute(
+                insert(Note).returning(Note.id),
+                [{"user_id": user_id, "title": f"Заметка {offset + i}", "description": "x" * 200,
+                  "is_archive": False} for i in range(size)],
+            )).scalars().all()
+            links = [
+                {"note_id": note_id, "tag_id": tag_ids[(note_id + k) % len(tag_ids)]}
+                for note_id in note_ids for k in range(tags_per_note)
+            ]
+            if links:
+                await session.execute(insert(NotesTags), links)
+        await session.commit()
+        return user_id
+
+
+async def joined_load(user_id: int):
+    """Прежний путь: joinedload(Note.tags).joinedload(NotesTags.tag) + unique()"""
+    async with async_session_maker() as session:
+        query = (
+            select(Note)
+            .options(joinedload(Note.tags).joinedload(NotesTags.tag))
+            .where(Note.user_id == user_id, Note.is_archive == False)
+            .order_by(Note.created_at.desc(), Note.id.desc())
+        )
+        res = await session.execute(query)
+        return res.unique().scalars().all()
+
+
+async def result_bytes(load) -> int:
+    """Объем строк, полученных путем загрузки из базы: его запросы перехватываются
+    и повторяются под sum(pg_column_size(...)) с теми же параметрами"""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        await load()
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+    total = 0
+    async with engine.connect() as connection:
+        for statement, parameters in statements:
+            total += (await connection.exec_driver_sql(
+                f"SELECT coalesce(sum(pg_column_size(q.*)), 0) FROM ({statement}) AS q", parameters
+            )).scalar_one()
+    return total
+
+
+async def timed(coro_factory, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await coro_factory()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+async def main(sizes: list[int], tags_per_note: int, repeat: int):
+    async with async_session_maker() as session:
+        tag_ids = (await session.execute(
+            insert(Tag).returning(Tag.id),
+            [{"name": f"bench-{i}", "color": "#000000"} for i in range(max(tags_per_note, 1) * 2)],
+        )).scalars().all()
+        await session.commit()
+
+    results = []
+    try:
+        for size in sizes:
+            user_id = await seed(size, tags_per_note, tag_ids)
+            try:
+                joined, batched = (lambda: joined_load(user_id)), (lambda: NoteCRUD.get_all(user_id))
+                results.append({
+                    "notes": size,
+                    "tags_per_note": tags_per_note,
+                    "joinedload": {"bytes": await result_bytes(joined), "seconds": await timed(joined, repeat)},
+                    "batched": {"bytes": await result_bytes(batched), "seconds": await timed(batched, repeat)},
+                })
+            finally:
+                async with async_session_maker() as session:
+                    await session.execute(delete(User).where(User.id == user_id))
+                    await session.commit()
+    finally:
+        async with async_session_maker() as session:
+            await session.execute(delete(Tag).where(Tag.id.in_(tag_ids)))
+            await session.commit()
+        await engine.dispose()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 50000])
+    parser.add_argument("--tags-per-note", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes, args.tags_per_note, args.repeat))
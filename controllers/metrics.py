@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+import services.metrics  # noqa: F401 - регистрирует метрики компонентов
+from metrics import REGISTRY
+from services.auth import get_metrics_reader
+
+router = APIRouter(tags=["metrics"])
+
+@router.get("/metrics", include_in_schema=False, dependencies=[Depends(get_metrics_reader)])
+async def get_metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
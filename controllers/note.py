@@ -1,47 +1,99 @@
-from typing import Annotated
+from datetime import datetime
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, Depends
-from fastapi.security import OAuth2PasswordBearer
-from dto.note_dto import NoteCreateRequest, NoteResponse, NoteUpdateRequest
+from fastapi import APIRouter, Depends, Query, Header
+from dto.note_dto import (
+    NoteCreateRequest, NoteResponse, NoteSummaryResponse, NoteUpdateRequest, PageResponse, NoteBatchRequest,
+    NoteBatchResponse, NoteSearchResult, NoteChangesResponse
+)
 
+from database.database import transactional, read_only
 from services import note as note_service
+from services.auth import CurrentUser, StreamUser
 
 router = APIRouter(prefix="/notes", tags=["notes"])
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+@router.get("/", dependencies=[Depends(read_only)])
+async def get_all_my_notes(user: CurrentUser,
+                           limit: Annotated[int, Query(ge=1, le=200)] = 50,
+                           cursor: str | None = None,
+                           tags: Annotated[str | None, Query(description="id тегов через запятую")] = None,
+                           match: Literal["any", "all"] = "any",
+                           if_none_match: Annotated[str | None, Header()] = None,
+                           if_modified_since: Annotated[str | None, Header()] = None) -> PageResponse[NoteSummaryResponse]:
+    return await note_service.get_all_my(user.id, limit, cursor, tags, match, if_none_match, if_modified_since)
 
-@router.get("/")
-async def get_all_my_notes(token: Annotated[str, Depends(oauth2_scheme)]):
-    return await note_service.get_all_my(token)
+@router.get("/archives", dependencies=[Depends(read_only)])
+async def get_all_my_notes_archives(user: CurrentUser,
+                                    limit: Annotated[int, Query(ge=1, le=200)] = 50,
+                                    cursor: str | None = None,
+                                    tags: Annotated[str | None, Query(description="id тегов через запятую")] = None,
+                                    match: Literal["any", "all"] = "any",
+                                    if_none_match: Annotated[str | None, Header()] = None,
+                                    if_modified_since: Annotated[str | None, Header()] = None
+                                    ) -> PageResponse[NoteSummaryResponse]:
+    return await note_service.get_all_my_archives(user.id, limit, cursor, tags, match,
+                                                  if_none_match, if_modified_since)
 
-@router.get("/archives")
-async def get_all_my_notes_archives(token: Annotated[str, Depends(oauth2_scheme)]):
-    return await note_service.get_all_my_archives(token)
+@router.get("/search", dependencies=[Depends(read_only)])
+async def search_my_notes(user: CurrentUser,
+                          q: Annotated[str, Query(min_length=1, max_length=256)],
+                          limit: Annotated[int, Query(ge=1, le=200)] = 50,
+                          cursor: str | None = None) -> PageResponse[NoteSearchResult]:
+    return await note_service.search(user.id, q, limit, cursor)
 
-@router.patch("/archive/add/{note_id}")
-async def add_archive_by_id(note_id: int, token: Annotated[str, Depends(oauth2_scheme)]):
-    return await note_service.archive_add_by_id(note_id, token)
+@router.get("/changes", dependencies=[Depends(read_only)])
+async def get_my_changes(user: CurrentUser,
+                         since: Annotated[str | None, Query(description="watermark из прошлого ответа")] = None,
+                         limit: Annotated[int, Query(ge=1, le=1000)] = 200) -> NoteChangesResponse:
+    return await note_service.get_changes(user.id, limit, since)
 
-@router.patch("/archive/remove/{note_id}")
-async def remove_archive_by_id(note_id: int, token: Annotated[str, Depends(oauth2_scheme)]):
-    return await note_service.archive_remove_by_id(note_id, token)
+@router.post("/stream/ticket")
+async def create_stream_ticket(user: CurrentUser):
+    """Короткоживущий билет для new EventSource("/api/notes/stream?ticket=...")"""
+    return note_service.stream_ticket(user.id)
 
-@router.get("/{id}")
-async def get_by_id(id: int) -> NoteResponse:
-    return await note_service.get_by_id(id)
+@router.get("/stream")
+async def stream_my_changes(user: StreamUser):
+    """Server-Sent Events: событие changes с новой ревизией, после него клиент читает /changes"""
+    return await note_service.stream_changes(user.id)
 
-@router.post("/", status_code=201)
-async def create_note(dto: NoteCreateRequest, token: Annotated[str, Depends(oauth2_scheme)]):
-    return await note_service.create_note(dto, token)
+@router.patch("/archive/add/{note_id}", dependencies=[Depends(transactional)])
+async def add_archive_by_id(note_id: int, user: CurrentUser):
+    return await note_service.archive_add_by_id(note_id, user.id)
 
-@router.put("/{note_id}")
-async def update_note_by_id(note_id: int, dto: NoteUpdateRequest, token: Annotated[str, Depends(oauth2_scheme)]):
-    return await note_service.update_note(note_id, dto, token)
+@router.patch("/archive/remove/{note_id}", dependencies=[Depends(transactional)])
+async def remove_archive_by_id(note_id: int, user: CurrentUser):
+    return await note_service.archive_remove_by_id(note_id, user.id)
+
+@router.get("/{id}", dependencies=[Depends(read_only)])
+async def get_by_id(id: int, user: CurrentUser,
+                    if_none_match: Annotated[str | None, Header()] = None,
+                    if_modified_since: Annotated[str | None, Header()] = None) -> NoteResponse:
+    return await note_service.get_by_id(id, user.id, if_none_match, if_modified_since)
+
+@router.post("/", status_code=201, dependencies=[Depends(transactional)])
+async def create_note(dto: NoteCreateRequest, user: CurrentUser):
+    return await note_service.create_note(dto, user.id)
+
+@router.post("/batch", dependencies=[Depends(transactional)])
+async def apply_batch(dto: NoteBatchRequest, user: CurrentUser) -> NoteBatchResponse:
+    return await note_service.apply_batch(user.id, dto)
+
+@router.put("/{note_id}", dependencies=[Depends(transactional)])
+async def update_note_by_id(note_id: int, dto: NoteUpdateRequest, user: CurrentUser):
+    return await note_service.update_note(note_id, dto, user.id)
 
 @router.get("/export/excel")
-async def export_notes_to_excel(token: Annotated[str, Depends(oauth2_scheme)]):
-    return await note_service.export_to_excel(token)
+async def export_notes_to_excel(user: CurrentUser):
+    return await note_service.export_to_excel(user.id)
+
+@router.get("/export/{fmt}")
+async def export_notes(fmt: Literal["csv", "ndjson", "parquet"], user: CurrentUser,
+                       since: datetime | None = None,
+                       accept_encoding: Annotated[str | None, Header()] = None):
+    return await note_service.export_data(user.id, fmt, since, accept_encoding)
 
-@router.delete("/{note_id}")
-async def delete_by_id(note_id: int, token: Annotated[str, Depends(oauth2_scheme)]):
-    return await note_service.delete_by_id(note_id, token)
\ No newline at end of file
+@router.delete("/{note_id}", dependencies=[Depends(transactional)])
+async def delete_by_id(note_id: int, user: CurrentUser):
+    return await note_service.delete_by_id(note_id, user.id)
\ No newline at end of file
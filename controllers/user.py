@@ -1,7 +1,4 @@
-from typing import Annotated
-
 from fastapi import APIRouter, Depends
-from fastapi.security import OAuth2PasswordBearer
 
 from dto.user_dto import (
     # Запросы
@@ -9,17 +6,19 @@ from dto.user_dto import (
     # Ответы
     UserTokenResponse, UserDB
 )
+from database.database import read_only
 from services import user as user_service
+from services.auth import CurrentUser
 
 router = APIRouter(prefix="/users", tags=["users"])
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-
-@router.get("/profile")
-async def get_profile(token: Annotated[str, Depends(oauth2_scheme)]) -> UserDB:
-    return await user_service.get_profile(token)
+@router.get("/profile", dependencies=[Depends(read_only)])
+async def get_profile(user: CurrentUser) -> UserDB:
+    return await user_service.get_profile(user.id)
 
 
+# Без единицы работы на запрос: пока argon2 считает хэш в пуле, соединение с базой не удерживается,
+# каждый CRUD-вызов открывает свою короткую транзакцию
 @router.post("/", status_code=201)
 async def create_user(dto: UserRegisterRequest) -> UserTokenResponse:
     return await user_service.register(dto)
@@ -1,6 +1,16 @@
-from sqlalchemy import select, insert, update, delete
+from sqlalchemy import select, insert, update, delete, any_, bindparam, Integer
+from sqlalchemy.dialects.postgresql import ARRAY
 
-from database.database import async_session_maker
+from database.database import session_scope
+
+
+def any_of(column, values):
+    """Условие column = ANY(:values) с одним параметром-массивом.
+
+    В отличие от IN не создает параметр на каждый элемент, поэтому не упирается
+    в лимит параметров asyncpg и не плодит разные тексты запроса.
+    """
+    return column == any_(bindparam(None, list(values), type_=ARRAY(Integer)))
 
 
 class BaseCRUD:
@@ -11,7 +21,7 @@ class BaseCRUD:
     @classmethod
     async def find_all(cls, **filters):
         """Поиск всех записей по фильтру"""
-        async with async_session_maker() as session:
+        async with session_scope() as session:
             query = select(cls.model).filter_by(**filters)
             result = await session.execute(query)
             return result.scalars().all()
@@ -19,7 +29,7 @@ class BaseCRUD:
     @classmethod
     async def find_one_or_none(cls, **filters):
         """Поиск одной записи по фильтру"""
-        async with async_session_maker() as session:
+        async with session_scope() as session:
             query = select(cls.model).filter_by(**filters)
             result = await session.execute(query)
             return result.scalar_one_or_none()
@@ -27,7 +37,7 @@ class BaseCRUD:
     @classmethod
     async def find_by_id(cls, model_id: int):
         """Поиск одной записи по id"""
-        async with async_session_maker() as session:
+        async with session_scope() as session:
             query = select(cls.model).where(cls.model.id == model_id)
             result = await session.execute(query)
             return result.scalar_one_or_none()
@@ -36,43 +46,38 @@ class BaseCRUD:
     @classmethod
     async def create(cls, **data):
         """Создание записи"""
-        async with async_session_maker() as session:
+        async with session_scope() as session:
             query = insert(cls.model).values(**data)
             await session.execute(query)
-            await session.commit()
 
     @classmethod
     async def create_and_return_id(cls, **data):
         """Создание и возврат id созданной записи"""
-        async with async_session_maker() as session:
+        async with session_scope() as session:
             query = insert(cls.model).values(**data).returning(cls.model.id)
             result = await session.execute(query)
-            await session.commit()
             return result.scalar_one_or_none()
 
     @classmethod
     async def create_and_return_all(cls, **data):
         """Создание и возврат созданной записи"""
-        async with async_session_maker() as session:
+        async with session_scope() as session:
             query = insert(cls.model).values(**data).returning(cls.model)
             result = await session.execute(query)
-            await session.commit()
             return result.scalars().all()
 
     # Обновление
     @classmethod
     async def update(cls, model_id: int, **data):
         """Обновление записи по id"""
-        async with async_session_maker() as session:
+        async with session_scope() as session:
             query = update(cls.model).where(cls.model.id == model_id).values(**data)
             await session.execute(query)
-            await session.commit()
 
     # Удаление
     @classmethod
     async def delete(cls, model_id: int):
         """Удаление записи по id"""
-        async with async_session_maker() as session:
+        async with session_scope() as session:
             query = delete(cls.model).where(cls.model.id == model_id)
-            await session.execute(query)
-            await session.commit()
\ No newline at end of file
+            await session.execute(query)
\ No newline at end of file
@@ -1,9 +1,62 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import exc
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from metrics import Histogram
 from settings import settings
 
+POOL_WAIT = Histogram("db_pool_checkout_wait_seconds", "Ожидание соединения из пула")
+
+
+class PoolStats:
+    """Сколько запросы ждали соединение из пула (включая открытие нового соединения)"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record(self, seconds: float):
+        self.checkouts += 1
+        self.wait_seconds_total += seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+        POOL_WAIT.observe(seconds)
+
+
+pool_stats = PoolStats()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Пул, замеряющий ожидание соединения при каждой выдаче"""
 
-engine = create_async_engine(settings.DB_URL, echo=True, future=True)
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_stats.timeouts += 1
+            raise
+        finally:
+            pool_stats.record(time.perf_counter() - started)
+
+
+engine = create_async_engine(
+    settings.DB_URL,
+    echo=settings.DB_ECHO,
+    poolclass=InstrumentedQueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    connect_args={"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE},
+)
 async_session_maker = sessionmaker(
     bind=engine,
     class_=AsyncSession,
@@ -15,7 +68,90 @@ async_session_maker = sessionmaker(
 class Base(DeclarativeBase):
     pass
 
-async def get_db() -> AsyncSession:
+class UnitOfWork:
+    """Сессия и транзакция, общие для всех CRUD-вызовов одного запроса"""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.callbacks = []
+
+
+_current_uow: ContextVar[UnitOfWork | None] = ContextVar("current_uow", default=None)
+
+
+@asynccontextmanager
+async def unit_of_work(read_only: bool = False):
+    """Единица работы: все CRUD-вызовы внутри идут через одну сессию, коммит один в конце.
+
+    read_only открывает транзакцию как BEGIN READ ONLY (без лишнего запроса к базе).
+    После коммита выполняются колбэки, зарегистрированные через after_commit().
+    """
+    async with async_session_maker() as session:
+        if read_only:
+            await session.connection(execution_options={"postgresql_readonly": True})
+        uow = UnitOfWork(session)
+        token = _current_uow.set(uow)
+        try:
+            yield session
+            await session.commit()
+        finally:
+            _current_uow.reset(token)
+    for callback in uow.callbacks:
+        callback()
+
+
+@asynccontextmanager
+async def session_scope():
+    """Сессия текущей единицы работы, а вне ее - отдельная сессия с коммитом в конце"""
+    uow = _current_uow.get()
+    if uow is not None:
+        yield uow.session
+        return
     async with async_session_maker() as session:
         yield session
-        await session.commit()
\ No newline at end of file
+        await session.commit()
+
+
+def after_commit(callback):
+    """Выполнить callback после коммита текущей единицы работы (вне ее - сразу)"""
+    uow = _current_uow.get()
+    if uow is None:
+        callback()
+    else:
+        uow.callbacks.append(callback)
+
+
+async def transactional():
+    """Зависимость FastAPI: единица работы на запрос"""
+    async with unit_of_work() as session:
+        yield session
+
+
+async def read_only():
+    """Зависимость FastAPI: единица работы только для чтения"""
+    async with unit_of_work(read_only=True) as session:
+        yield session
+
+
+async def warm_up_pool(count: int):
+    """Заранее открывает count соединений, чтобы первые запросы не ждали подключения к базе"""
+    connections = [engine.connect() for _ in range(min(count, settings.DB_POOL_SIZE))]
+    try:
+        await asyncio.gather(*(connection.start() for connection in connections), return_exceptions=True)
+    finally:
+        for connection in connections:
+            if connection.sync_connection is not None:
+                await connection.close()
+
+
+def pool_status() -> dict:
+    pool = engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "checkouts": pool_stats.checkouts,
+        "timeouts": pool_stats.timeouts,
+        "wait_seconds_total": pool_stats.wait_seconds_total,
+        "wait_seconds_max": pool_stats.wait_seconds_max,
+    }
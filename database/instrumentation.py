@@ -0,0 +1,101 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+from metrics import Counter, Histogram
+
+DB_STATEMENTS = Counter("db_statements_total", "SQL-запросы по виду", ("kind",))
+DB_STATEMENT_DURATION = Histogram("db_statement_duration_seconds", "Время выполнения SQL-запроса", ("kind",))
+
+_STATEMENT_KINDS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH"}
+
+
+class QueryCounter:
+    """Сколько SQL-запросов выполнено и сколько времени они заняли.
+
+    statements - выполнения курсора (executemany считается одним), parameter_sets - наборы
+    параметров в них, round_trips - запросы плюс BEGIN/COMMIT/ROLLBACK.
+    """
+    __slots__ = ("statements", "parameter_sets", "round_trips", "seconds", "parent")
+
+    def __init__(self, parent: "QueryCounter | None" = None):
+        self.statements = 0
+        self.parameter_sets = 0
+        self.round_trips = 0
+        self.seconds = 0.0
+        self.parent = parent
+
+    def as_dict(self) -> dict:
+        return {"statements": self.statements, "parameter_sets": self.parameter_sets,
+                "round_trips": self.round_trips, "seconds": round(self.seconds, 6)}
+
+
+_current_counter: ContextVar[QueryCounter | None] = ContextVar("query_counter", default=None)
+
+
+@contextmanager
+def count_queries():
+    """Счетчик запросов, выполненных внутри блока (в том числе во вложенных счетчиках).
+
+    Работает через contextvars: SQLAlchemy выполняет запросы в greenlet с контекстом
+    вызывающей задачи, поэтому запросы других одновременных запросов сюда не попадают.
+    """
+    counter = QueryCounter(_current_counter.get())
+    token = _current_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _current_counter.reset(token)
+
+
+def _statement_kind(statement: str) -> str:
+    kind = statement.lstrip()[:6].upper()
+    if kind.startswith("WITH"):
+        return "WITH"
+    return kind if kind in _STATEMENT_KINDS else "OTHER"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    kind = _statement_kind(statement)
+    DB_STATEMENTS.inc(kind)
+    DB_STATEMENT_DURATION.observe(elapsed, kind)
+    parameter_sets = len(parameters) if executemany else 1
+    counter = _current_counter.get()
+    while counter is not None:
+        counter.statements += 1
+        counter.parameter_sets += parameter_sets
+        counter.round_trips += 1
+        counter.seconds += elapsed
+        counter = counter.parent
+
+
+def _transaction_round_trip(conn):
+    counter = _current_counter.get()
+    while counter is not None:
+        counter.round_trips += 1
+        counter = counter.parent
+
+
+def _handle_error(context):
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def instrument_engine(engine):
+    """Подключает замеры ко всем запросам движка (для AsyncEngine - к его sync_engine)"""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+    for name in ("begin", "commit", "rollback"):
+        event.listen(sync_engine, name, _transaction_round_trip)
@@ -1,6 +1,11 @@
 from datetime import datetime
-from typing import List, Optional
-from pydantic import BaseModel
+from typing import Annotated, Generic, List, Literal, Optional, TypeVar, Union
+from pydantic import BaseModel, Field
+
+T = TypeVar("T")
+
+# id заметки или тега из запроса: значение вне диапазона Integer дошло бы до базы и дало 500
+RowId = Annotated[int, Field(ge=1, le=2 ** 31 - 1)]
 
 
 class NoteDB(BaseModel):
@@ -16,7 +21,7 @@ class NoteDB(BaseModel):
 class NoteCreateRequest(BaseModel):
     title: str
     description: Optional[str] = None
-    noteTags: List[int] = []
+    noteTags: List[RowId] = []
 
 
 class TagResponse(BaseModel):
@@ -28,7 +33,7 @@ class TagResponse(BaseModel):
 class NoteUpdateRequest(BaseModel):
     title: str
     description: str
-    tags: list[int] = []
+    tags: list[RowId] = []
 
 
 class NoteResponse(BaseModel):
@@ -40,3 +45,72 @@ class NoteResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
     tags: list[TagResponse]
+
+
+class NoteSummaryResponse(BaseModel):
+    """Заметка в списке: вместо описания - его начало и полная длина в символах"""
+    id: int
+    title: str
+    user_id: int
+    description_preview: str | None
+    description_length: int | None
+    is_archive: bool
+    created_at: datetime
+    updated_at: datetime
+    tags: list[TagResponse]
+
+
+class NoteSearchResult(NoteSummaryResponse):
+    rank: float
+    snippet: str
+
+
+class PageResponse(BaseModel, Generic[T]):
+    items: list[T]
+    next_cursor: str | None = None
+
+
+class NoteChangesResponse(BaseModel):
+    notes: list[NoteResponse]
+    deleted: list[int]
+    watermark: str
+    has_more: bool
+
+
+class NoteBatchCreate(BaseModel):
+    op: Literal["create"]
+    title: str
+    description: Optional[str] = None
+    tags: list[RowId] = []
+
+
+class NoteBatchUpdate(BaseModel):
+    op: Literal["update"]
+    note_id: RowId
+    title: str
+    description: str
+    tags: list[RowId] = []
+
+
+class NoteBatchAction(BaseModel):
+    op: Literal["archive", "unarchive", "delete"]
+    note_id: RowId
+
+
+NoteBatchOperation = Annotated[Union[NoteBatchCreate, NoteBatchUpdate, NoteBatchAction], Field(discriminator="op")]
+
+
+class NoteBatchRequest(BaseModel):
+    operations: list[NoteBatchOperation] = Field(min_length=1, max_length=500)
+
+
+class NoteBatchResult(BaseModel):
+    index: int
+    op: str
+    ok: bool
+    note_id: int | None = None
+    detail: str | None = None
+
+
+class NoteBatchResponse(BaseModel):
+    results: list[NoteBatchResult]
@@ -12,4 +12,10 @@ class TagDB(BaseModel):
 
 class TagRequest(BaseModel):
     name: str
-    color: str
\ No newline at end of file
+    color: str
+
+
+class TagImportResponse(BaseModel):
+    created: int
+    updated: int
+    tags: list[TagDB]
\ No newline at end of file
@@ -1,9 +1,81 @@
+import time
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
 
 from controllers import routers
+from controllers.metrics import router as metrics_router
+from database.database import engine, warm_up_pool
+from database.instrumentation import count_queries, instrument_engine
+from metrics import Counter, Gauge, Histogram
+from security import password_pool
+from services.cache import response_cache
+from services.notifications import notes_listener
+from services.tag import tag_registry
+from settings import settings
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await warm_up_pool(settings.DB_POOL_WARMUP)
+    await tag_registry.load()
+    notes_listener.start()
+    yield
+    await notes_listener.stop()
+    await response_cache.close()
+    password_pool.shutdown()
+    await engine.dispose()
+
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP-запросы", ("method", "route", "status"))
+HTTP_DURATION = Histogram("http_request_duration_seconds", "Время обработки HTTP-запроса", ("method", "route"))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP-запросы в обработке")
+HTTP_DB_STATEMENTS = Histogram("http_request_db_statements", "SQL-запросы на один HTTP-запрос",
+                               ("method", "route"), buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89))
+
+
+class MetricsMiddleware:
+    """Чистый ASGI-middleware: время, статус и число SQL-запросов по шаблону маршрута.
+
+    Метка route - шаблон пути (/api/notes/{id}), а не сам путь, чтобы число рядов
+    метрик не росло с числом заметок; неизвестные пути считаются вместе.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            with count_queries() as queries:
+                await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            HTTP_REQUESTS.inc(method, path, status)
+            HTTP_DURATION.observe(time.perf_counter() - started, method, path)
+            HTTP_DB_STATEMENTS.observe(queries.statements, method, path)
+
+
+instrument_engine(engine)
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 origins = ["https://cwnotes.ru"]
 
@@ -15,6 +87,9 @@ app.add_middleware(
     allow_headers=["*"],
     expose_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 for router in routers:
-    app.include_router(router, prefix="/api")
\ No newline at end of file
+    app.include_router(router, prefix="/api")
+# /metrics - без префикса /api, по привычному для Prometheus адресу
+app.include_router(metrics_router)
\ No newline at end of file
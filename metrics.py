@@ -0,0 +1,138 @@
+"""Минимальные метрики в формате Prometheus без внешних зависимостей.
+
+Метрики обновляются из event loop (и из обработчиков событий SQLAlchemy в том же потоке),
+поэтому обходятся без блокировок: обновление - поиск в словаре и сложение.
+"""
+import math
+import os
+import resource
+from bisect import bisect_left
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list["Metric"] = []
+
+    def register(self, metric: "Metric"):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        if value.is_integer():
+            return str(int(value))
+    return str(value)
+
+
+class Metric:
+    """Базовая метрика. callback() вместо собственных значений читает чужие счетчики:
+    возвращает число или словарь {значения меток: число}.
+    """
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), callback=None,
+                 registry: Registry = REGISTRY):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._callback = callback
+        self._values: dict[tuple, float] = {}
+        registry.register(self)
+
+    def _items(self):
+        if self._callback is None:
+            return self._values.items()
+        value = self._callback()
+        return value.items() if isinstance(value, dict) else [((), value)]
+
+    def samples(self):
+        for label_values, value in self._items():
+            yield self.name, tuple(zip(self.labels, label_values)), value
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *label_values, amount: float = 1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, *label_values):
+        self._values[label_values] = value
+
+    def inc(self, *label_values, amount: float = 1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def dec(self, *label_values, amount: float = 1):
+        self.inc(*label_values, amount=-amount)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets=DEFAULT_BUCKETS,
+                 registry: Registry = REGISTRY):
+        super().__init__(name, help, labels, registry=registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *label_values):
+        state = self._values.get(label_values)
+        if state is None:
+            # Счетчики по корзинам (последняя - +Inf), сумма, количество
+            state = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def samples(self):
+        for label_values, (counts, total, count) in self._values.items():
+            labels = tuple(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", labels + (("le", _format_value(float(bound))),), cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+def process_rss_bytes() -> int:
+    """Текущий RSS процесса; вне Linux - пиковый RSS из getrusage"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss в килобайтах на Linux и в байтах на macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if os.uname().sysname == "Darwin" else maxrss * 1024
+
+
+Gauge("process_resident_memory_bytes", "Резидентная память процесса, байт", callback=process_rss_bytes)
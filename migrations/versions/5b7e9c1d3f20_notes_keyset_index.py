@@ -0,0 +1,39 @@
+"""notes keyset index
+
+Revision ID: 5b7e9c1d3f20
+Revises: 2d8a65ad5a39
+Create Date: 2026-10-18 10:12:31.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b7e9c1d3f20'
+down_revision: Union[str, None] = '2d8a65ad5a39'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Индекс строится без блокировки записи в notes, поэтому вне транзакции миграции
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_notes_user_id_is_archive_created_at_id',
+            'notes',
+            ['user_id', 'is_archive', 'created_at', 'id'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_notes_user_id_is_archive_created_at_id',
+            table_name='notes',
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,57 @@
+"""notes full text search
+
+Revision ID: 8c2f4a6e1b37
+Revises: 5b7e9c1d3f20
+Create Date: 2026-10-18 14:37:05.918243
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c2f4a6e1b37'
+down_revision: Union[str, None] = '5b7e9c1d3f20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('russian'::regconfig, coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english'::regconfig, coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('russian'::regconfig, left(coalesce(description, ''), 100000)), 'B') || "
+    "setweight(to_tsvector('english'::regconfig, left(coalesce(description, ''), 100000)), 'B')"
+)
+
+
+def upgrade() -> None:
+    # btree_gin позволяет держать user_id и search_vector в одном GIN-индексе
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gin')
+    # Добавление STORED-колонки переписывает таблицу notes под эксклюзивной блокировкой
+    op.add_column('notes', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed(SEARCH_VECTOR_SQL, persisted=True),
+        nullable=True,
+    ))
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_notes_user_id_search_vector',
+            'notes',
+            ['user_id', 'search_vector'],
+            unique=False,
+            postgresql_using='gin',
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_notes_user_id_search_vector',
+            table_name='notes',
+            postgresql_concurrently=True,
+        )
+    op.drop_column('notes', 'search_vector')
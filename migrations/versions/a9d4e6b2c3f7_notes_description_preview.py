@@ -0,0 +1,54 @@
+"""notes description preview and lz4 compression
+
+Revision ID: a9d4e6b2c3f7
+Revises: f3c9a1d6b8e2
+Create Date: 2026-10-18 19:04:27.518263
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9d4e6b2c3f7'
+down_revision: Union[str, None] = 'f3c9a1d6b8e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Совпадает с models.notes.NOTE_PREVIEW_LENGTH на момент миграции
+PREVIEW_LENGTH = 300
+
+
+def upgrade() -> None:
+    # Хранимые вычисляемые столбцы: таблица переписывается один раз, дальше значения считает база
+    op.add_column('notes', sa.Column(
+        'description_preview', sa.String(), sa.Computed(f'left(description, {PREVIEW_LENGTH})', persisted=True)
+    ))
+    op.add_column('notes', sa.Column(
+        'description_length', sa.Integer(), sa.Computed('char_length(description)', persisted=True)
+    ))
+    # Длинные описания (больше ~2 КБ) Postgres сжимает в TOAST сам; с 14-й версии - быстрым lz4,
+    # если сервер собран с его поддержкой. Действует на новые значения, старые остаются в pglz.
+    op.execute(
+        "DO $$ BEGIN "
+        "IF current_setting('server_version_num')::int >= 140000 THEN "
+        "ALTER TABLE notes ALTER COLUMN description SET COMPRESSION lz4; "
+        "END IF; "
+        "EXCEPTION WHEN feature_not_supported THEN "
+        "RAISE NOTICE 'lz4 недоступен, описания сжимаются pglz'; "
+        "END $$"
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        "DO $$ BEGIN "
+        "IF current_setting('server_version_num')::int >= 140000 THEN "
+        "ALTER TABLE notes ALTER COLUMN description SET COMPRESSION default; "
+        "END IF; "
+        "END $$"
+    )
+    op.drop_column('notes', 'description_length')
+    op.drop_column('notes', 'description_preview')
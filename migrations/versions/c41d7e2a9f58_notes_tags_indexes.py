@@ -0,0 +1,66 @@
+"""notes_tags unique pair and tag index
+
+Revision ID: c41d7e2a9f58
+Revises: 8c2f4a6e1b37
+Create Date: 2026-10-18 16:02:48.115870
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41d7e2a9f58'
+down_revision: Union[str, None] = '8c2f4a6e1b37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+DEDUPLICATE_SQL = (
+    'DELETE FROM notes_tags a USING notes_tags b '
+    'WHERE a.note_id = b.note_id AND a.tag_id = b.tag_id AND a.id > b.id'
+)
+
+
+def upgrade() -> None:
+    # Уникальный индекс строится CONCURRENTLY: дубль, вставленный между чисткой и
+    # построением, провалит сборку и оставит INVALID-индекс. Поэтому на время миграции
+    # запись в notes_tags нужно остановить (старая версия приложения вставляет связи
+    # без ON CONFLICT). Повторный запуск безопасен: недостроенные индексы удаляются.
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS uq_notes_tags_note_id_tag_id')
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_notes_tags_tag_id_note_id')
+        # Оставляем по одной связи на пару (note_id, tag_id) - самую раннюю; чистка идет
+        # непосредственно перед построением, чтобы окно для новых дублей было минимальным
+        op.execute(DEDUPLICATE_SQL)
+        op.create_index(
+            'uq_notes_tags_note_id_tag_id',
+            'notes_tags',
+            ['note_id', 'tag_id'],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_notes_tags_tag_id_note_id',
+            'notes_tags',
+            ['tag_id', 'note_id'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+    # Уникальный индекс уже построен без блокировки записи, ограничение только привязывается к нему
+    op.execute(
+        'ALTER TABLE notes_tags ADD CONSTRAINT uq_notes_tags_note_id_tag_id '
+        'UNIQUE USING INDEX uq_notes_tags_note_id_tag_id'
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_notes_tags_note_id_tag_id', 'notes_tags', type_='unique')
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_notes_tags_tag_id_note_id',
+            table_name='notes_tags',
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,72 @@
+"""notes revisions and tombstones
+
+Revision ID: d7a3f1c9e2b4
+Revises: c41d7e2a9f58
+Create Date: 2026-10-18 16:48:20.530112
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7a3f1c9e2b4'
+down_revision: Union[str, None] = 'c41d7e2a9f58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Колонки с константным DEFAULT добавляются без перезаписи таблиц
+    op.add_column('users', sa.Column('notes_revision', sa.BigInteger(), server_default='0', nullable=False))
+    op.add_column('notes', sa.Column('revision', sa.BigInteger(), server_default='0', nullable=False))
+    # Существующие заметки получают ревизии в порядке изменения, счетчик пользователя - последнюю из них
+    op.execute(
+        'UPDATE notes SET revision = r.revision FROM ('
+        'SELECT id, row_number() OVER (PARTITION BY user_id ORDER BY updated_at, id) AS revision FROM notes'
+        ') AS r WHERE r.id = notes.id'
+    )
+    op.execute(
+        'UPDATE users SET notes_revision = r.revision FROM ('
+        'SELECT user_id, max(revision) AS revision FROM notes GROUP BY user_id'
+        ') AS r WHERE r.user_id = users.id'
+    )
+    op.create_table(
+        'note_tombstones',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('note_id', sa.Integer(), nullable=False),
+        sa.Column('revision', sa.BigInteger(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_note_tombstones_user_id_revision_note_id',
+        'note_tombstones',
+        ['user_id', 'revision', 'note_id'],
+        unique=False,
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_notes_user_id_revision_id',
+            'notes',
+            ['user_id', 'revision', 'id'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_notes_user_id_revision_id',
+            table_name='notes',
+            postgresql_concurrently=True,
+        )
+    op.drop_index('ix_note_tombstones_user_id_revision_note_id', table_name='note_tombstones')
+    op.drop_table('note_tombstones')
+    op.drop_column('notes', 'revision')
+    op.drop_column('users', 'notes_revision')
@@ -0,0 +1,33 @@
+"""users notes_changed_at
+
+Revision ID: e5b8d2a7c6f1
+Revises: d7a3f1c9e2b4
+Create Date: 2026-10-18 17:35:12.664021
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b8d2a7c6f1'
+down_revision: Union[str, None] = 'd7a3f1c9e2b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column(
+        'notes_changed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False
+    ))
+    op.execute(
+        'UPDATE users SET notes_changed_at = r.changed_at FROM ('
+        'SELECT user_id, max(updated_at) AS changed_at FROM notes GROUP BY user_id'
+        ') AS r WHERE r.user_id = users.id'
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'notes_changed_at')
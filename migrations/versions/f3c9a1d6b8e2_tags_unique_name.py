@@ -0,0 +1,45 @@
+"""tags unique name
+
+Revision ID: f3c9a1d6b8e2
+Revises: e5b8d2a7c6f1
+Create Date: 2026-10-18 18:21:40.309514
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3c9a1d6b8e2'
+down_revision: Union[str, None] = 'e5b8d2a7c6f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Из тегов с одинаковым именем остается самый ранний (с меньшим id).
+    # Сначала убираем связи, которые после переноса совпали бы с уже имеющимися у заметки.
+    op.execute(
+        'DELETE FROM notes_tags a USING tags ta, notes_tags b, tags tb '
+        'WHERE a.tag_id = ta.id AND b.tag_id = tb.id AND a.note_id = b.note_id '
+        'AND ta.name = tb.name AND tb.id < ta.id'
+    )
+    op.execute(
+        'UPDATE notes_tags SET tag_id = k.id FROM tags t, tags k '
+        'WHERE notes_tags.tag_id = t.id AND k.name = t.name AND k.id < t.id '
+        'AND NOT EXISTS (SELECT 1 FROM tags e WHERE e.name = t.name AND e.id < k.id)'
+    )
+    op.execute('DELETE FROM tags t USING tags k WHERE k.name = t.name AND k.id < t.id')
+    # Как и в c41d7e2a9f58: тег с повторным именем, созданный до построения индекса, провалит
+    # его, поэтому создание тегов на время миграции нужно остановить. Недостроенный индекс
+    # прошлой попытки удаляется, и миграцию можно запустить снова.
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS uq_tags_name')
+        op.create_index('uq_tags_name', 'tags', ['name'], unique=True, postgresql_concurrently=True)
+    op.execute('ALTER TABLE tags ADD CONSTRAINT uq_tags_name UNIQUE USING INDEX uq_tags_name')
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_tags_name', 'tags', type_='unique')
@@ -1,3 +1,3 @@
 from .users import User as UserModel
-from .notes import Note as NoteModel, Tag as TagModel, NotesTags as NotesTagsModel
+from .notes import Note as NoteModel, Tag as TagModel, NotesTags as NotesTagsModel, NoteTombstone as NoteTombstoneModel
 
@@ -1,9 +1,22 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, DateTime, ForeignKey, Index, Computed, UniqueConstraint
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 
 from database.database import Base
 
+# Поисковый вектор по заголовку (вес A) и описанию (вес B) в русской и английской конфигурациях.
+# Описание обрезается: tsvector не может быть больше 1 МБ.
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('russian'::regconfig, coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english'::regconfig, coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('russian'::regconfig, left(coalesce(description, ''), 100000)), 'B') || "
+    "setweight(to_tsvector('english'::regconfig, left(coalesce(description, ''), 100000)), 'B')"
+)
+
+# Длина превью описания в списках заметок; меняется только миграцией
+NOTE_PREVIEW_LENGTH = 300
+
 
 class Note(Base):
     __tablename__ = 'notes'
@@ -15,10 +28,43 @@ class Note(Base):
     is_archive = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now(), nullable=False)
+    # Ревизия пользователя, в которой заметка менялась последний раз
+    revision = Column(BigInteger, nullable=False, default=0, server_default="0")
+    # Вычисляется базой; отложенная загрузка, чтобы не тянуть вектор в обычных выборках
+    search_vector = deferred(Column(TSVECTOR, Computed(SEARCH_VECTOR_SQL, persisted=True)))
+    # Превью и длина описания для списков: полное описание в списки не попадает
+    description_preview = deferred(Column(
+        String, Computed(f"left(description, {NOTE_PREVIEW_LENGTH})", persisted=True)
+    ))
+    description_length = deferred(Column(Integer, Computed("char_length(description)", persisted=True)))
 
     user = relationship("User", back_populates="notes")
     tags = relationship("NotesTags", back_populates="note")
 
+    __table_args__ = (
+        # Keyset-пагинация списков заметок: (created_at desc, id desc) в рамках пользователя и архива
+        Index("ix_notes_user_id_is_archive_created_at_id", "user_id", "is_archive", "created_at", "id"),
+        # GIN по (user_id, search_vector) требует расширения btree_gin
+        Index("ix_notes_user_id_search_vector", "user_id", "search_vector", postgresql_using="gin"),
+        # Синхронизация изменений: заметки пользователя после ревизии
+        Index("ix_notes_user_id_revision_id", "user_id", "revision", "id"),
+    )
+
+
+class NoteTombstone(Base):
+    """След удаленной заметки для синхронизации клиентов"""
+    __tablename__ = 'note_tombstones'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete="CASCADE"), nullable=False)
+    note_id = Column(Integer, nullable=False)
+    revision = Column(BigInteger, nullable=False)
+    deleted_at = Column(DateTime(timezone=True), default=func.now(), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_note_tombstones_user_id_revision_note_id", "user_id", "revision", "note_id"),
+    )
+
 
 class NotesTags(Base):
     __tablename__ = 'notes_tags'
@@ -30,6 +76,12 @@ class NotesTags(Base):
     note = relationship("Note", back_populates="tags")
     tag = relationship("Tag", back_populates="note")
 
+    __table_args__ = (
+        UniqueConstraint("note_id", "tag_id", name="uq_notes_tags_note_id_tag_id"),
+        # Фильтр заметок по тегу и поиск заметок тега при его удалении
+        Index("ix_notes_tags_tag_id_note_id", "tag_id", "note_id"),
+    )
+
 
 class Tag(Base):
     __tablename__ = 'tags'
@@ -41,3 +93,8 @@ class Tag(Base):
     updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now(), nullable=False)
 
     note = relationship("NotesTags", back_populates="tag")
+
+    __table_args__ = (
+        # Импорт тегов - upsert по имени
+        UniqueConstraint("name", name="uq_tags_name"),
+    )
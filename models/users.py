@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Boolean
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
@@ -16,6 +16,9 @@ class User(Base):
     password_hash = Column(String, nullable=False)
     created_at = Column(DateTime(timezone=True), default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now(), nullable=False)
+    # Счетчик изменений заметок пользователя, см. services/revision.py
+    notes_revision = Column(BigInteger, nullable=False, default=0, server_default="0")
+    notes_changed_at = Column(DateTime(timezone=True), default=func.now(), server_default=func.now(), nullable=False)
 
     notes = relationship("Note", back_populates='user')
 
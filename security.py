@@ -1,24 +1,125 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+
 from argon2 import PasswordHasher
 from jose import JWTError, jwt
 from settings import settings
 
-ph = PasswordHasher()
+logger = logging.getLogger(__name__)
+
+ph = PasswordHasher(
+    time_cost=settings.ARGON2_TIME_COST,
+    memory_cost=settings.ARGON2_MEMORY_COST,
+    parallelism=settings.ARGON2_PARALLELISM,
+)
 ALGORITHM = "HS256"
 
 
+@dataclass(frozen=True)
+class Principal:
+    """Пользователь, от имени которого выполняется запрос"""
+    id: int
+    is_admin: bool
+
+
+class TokenCache:
+    """LRU-кэш с TTL: sha256(токен) -> Principal.
+
+    Сам токен в памяти не хранится. Для каждого пользователя помнятся ключи его токенов,
+    чтобы evict_user() мог сбросить их, например, после смены флага is_admin.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, Principal]] = OrderedDict()
+        self._by_user: dict[int, set[str]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Principal | None:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, principal = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return principal
+
+    def set(self, token: str, principal: Principal, expires_at: float | None = None):
+        key = self._key(token)
+        ttl = self._ttl
+        if expires_at is not None:
+            # Не держим в кэше токен дольше, чем он действителен
+            ttl = min(ttl, expires_at - time.time())
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, principal)
+            self._by_user.setdefault(principal.id, set()).add(key)
+            while len(self._entries) > self._max_size:
+                self._remove(next(iter(self._entries)))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def evict_user(self, user_id: int):
+        with self._lock:
+            for key in list(self._by_user.get(user_id, ())):
+                self._remove(key)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._by_user.get(entry[1].id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[entry[1].id]
+
+
+token_cache = TokenCache(max_size=settings.AUTH_CACHE_MAX_SIZE, ttl=settings.AUTH_CACHE_TTL)
+
+
 def create_perpetual_token(data: dict):
     to_encode = data.copy()
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
+# Билет только для подписки на поток изменений: его можно передать в URL, он живет недолго
+STREAM_TICKET_SCOPE = "notes_stream"
+
+
+def create_stream_ticket(user_id: int) -> str:
+    payload = {
+        "sub": str(user_id),
+        "scope": STREAM_TICKET_SCOPE,
+        "exp": int(time.time()) + settings.NOTES_STREAM_TICKET_TTL,
+    }
+    return jwt.encode(payload, settings.SECRET_KEY, algorithm=ALGORITHM)
+
+
 def decode_access_token(token: str):
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
-        print(f"Декодированный payload: {payload}")  # Вывод декодированного payload
-        return payload
+        return jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError as e:
-        print(f"Ошибка декодирования: {e}")  # Логируем ошибку
+        logger.debug("Ошибка декодирования токена: %s", e)
         return None
 
 
@@ -31,3 +132,85 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
         return ph.verify(hashed_password, plain_password)
     except Exception:
         return False
+
+
+def verify_and_rehash(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """Проверка пароля и, если параметры argon2 изменились, новый хэш для сохранения"""
+    if not verify_password(plain_password, hashed_password):
+        return False, None
+    if ph.check_needs_rehash(hashed_password):
+        return True, ph.hash(plain_password)
+    return True, None
+
+
+class PasswordHashPoolBusy(Exception):
+    """Очередь на хэширование паролей переполнена"""
+
+
+class PasswordHashPool:
+    """Выполняет argon2 вне event loop с ограничением параллельности.
+
+    Одновременно считается не больше workers хэшей, еще max_queue вызовов могут ждать,
+    остальные сразу получают PasswordHashPoolBusy. Счетчики in_flight/waiting/rejected
+    показывают загрузку пула.
+    """
+
+    def __init__(self, kind: str, workers: int, max_queue: int):
+        self._kind = kind
+        self._workers = workers
+        self._max_queue = max_queue
+        self._executor: Executor | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self._kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self._workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="argon2")
+            self._semaphore = asyncio.Semaphore(self._workers)
+        return self._executor
+
+    async def run(self, fn, *args):
+        executor = self._get_executor()
+        if self.waiting >= self._max_queue:
+            self.rejected += 1
+            raise PasswordHashPoolBusy()
+        self.waiting += 1
+        self.peak_waiting = max(self.peak_waiting, self.waiting)
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_pool = PasswordHashPool(
+    kind=settings.PASSWORD_HASH_EXECUTOR,
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
+
+
+async def hash_password_async(password: str) -> str:
+    return await password_pool.run(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    return await password_pool.run(verify_and_rehash, plain_password, hashed_password)
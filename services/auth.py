@@ -0,0 +1,87 @@
+import secrets
+from typing import Annotated
+
+from fastapi import HTTPException, Depends, Query
+from fastapi.security import OAuth2PasswordBearer
+
+from security import Principal, STREAM_TICKET_SCOPE, decode_access_token, token_cache
+from services.user import UserCRUD
+from settings import settings
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+oauth2_optional = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
+
+
+def _user_id(payload: dict | None, scope: str | None) -> int:
+    # Билет потока не заменяет токен доступа, и наоборот
+    if payload is None or payload.get("scope") != scope:
+        raise HTTPException(status_code=401, detail="Не валидный токен")
+    user_id = payload.get("sub")
+    if not isinstance(user_id, str) or not user_id.isdigit():
+        raise HTTPException(status_code=401, detail="Не валидный токен")
+    return int(user_id)
+
+
+async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]) -> Principal:
+    principal = token_cache.get(token)
+    if principal is not None:
+        return principal
+
+    payload = decode_access_token(token)
+    user = await UserCRUD.find_by_id(model_id=_user_id(payload, None))
+    if user is None:
+        raise HTTPException(status_code=401, detail="Не валидный токен")
+
+    principal = Principal(id=user.id, is_admin=user.is_admin)
+    token_cache.set(token, principal, expires_at=payload.get("exp"))
+    return principal
+
+
+async def get_current_admin(user: Annotated[Principal, Depends(get_current_user)]) -> Principal:
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Нет доступа")
+    return user
+
+
+async def get_metrics_reader(token: Annotated[str | None, Depends(oauth2_optional)] = None) -> None:
+    """Доступ к /metrics: токен сборщика из METRICS_TOKEN или токен администратора"""
+    if token is None:
+        raise HTTPException(status_code=401, detail="Не валидный токен")
+    if settings.METRICS_TOKEN and secrets.compare_digest(token.encode(), settings.METRICS_TOKEN.encode()):
+        return
+    await get_current_admin(await get_current_user(token))
+
+
+async def get_stream_user(
+    token: Annotated[str | None, Depends(oauth2_optional)] = None,
+    ticket: Annotated[str | None, Query(description="билет из POST /notes/stream/ticket")] = None,
+) -> Principal:
+    """Пользователь потока событий: по заголовку Authorization или по билету в URL.
+
+    Браузерный EventSource не умеет передавать заголовки, поэтому он подключается
+    с коротким билетом, а не с бессрочным токеном доступа.
+    """
+    if token is not None:
+        return await get_current_user(token)
+    if ticket is None:
+        raise HTTPException(status_code=401, detail="Не валидный токен")
+    user = await UserCRUD.find_by_id(model_id=_user_id(decode_access_token(ticket), STREAM_TICKET_SCOPE))
+    if user is None:
+        raise HTTPException(status_code=401, detail="Не валидный токен")
+    return Principal(id=user.id, is_admin=user.is_admin)
+
+
+def evict_user(user_id: int):
+    """Сбросить закэшированные токены пользователя.
+
+    Вызывать после коммита любого изменения, влияющего на Principal: смены пароля или
+    is_admin, удаления пользователя (after_commit(lambda: evict_user(user_id))). Пока
+    таких операций в API нет, и функцию никто не вызывает. Сброс действует только в
+    текущем воркере: остальные доверяют кэшу до AUTH_CACHE_TTL.
+    """
+    token_cache.evict_user(user_id)
+
+
+CurrentUser = Annotated[Principal, Depends(get_current_user)]
+CurrentAdmin = Annotated[Principal, Depends(get_current_admin)]
+StreamUser = Annotated[Principal, Depends(get_stream_user)]
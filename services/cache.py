@@ -0,0 +1,152 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Protocol
+
+from services.singleflight import SingleFlight
+from settings import settings
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # общий уровень кэша - необязательная зависимость
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend(Protocol):
+    """Хранилище готовых тел ответов: ключ -> байты"""
+
+    async def get(self, key: str) -> bytes | None: ...
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None: ...
+
+    async def delete(self, key: str) -> None: ...
+
+
+class InMemoryBackend:
+    """LRU с TTL в памяти процесса, ограниченный суммарным размером значений"""
+
+    def __init__(self, max_bytes: int):
+        self._max_bytes = max_bytes
+        self._size = 0
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+
+    async def get(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        if len(value) > self._max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._size += len(value)
+        while self._size > self._max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    async def delete(self, key: str) -> None:
+        self._remove(key)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[1])
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Общий для всех воркеров уровень в Redis (или совместимом сервере).
+
+    Ошибки Redis не роняют запрос: кэш просто считается промахнувшимся.
+    """
+
+    def __init__(self, url: str):
+        self._client = redis.from_url(url)
+
+    async def get(self, key: str) -> bytes | None:
+        try:
+            return await self._client.get(key)
+        except redis.RedisError as e:
+            logger.warning("Ошибка чтения из кэша: %s", e)
+            return None
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        try:
+            await self._client.set(key, value, px=int(ttl * 1000))
+        except redis.RedisError as e:
+            logger.warning("Ошибка записи в кэш: %s", e)
+
+    async def delete(self, key: str) -> None:
+        try:
+            await self._client.delete(key)
+        except redis.RedisError as e:
+            logger.warning("Ошибка удаления из кэша: %s", e)
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class ResponseCache:
+    """Двухуровневый кэш: LRU процесса, затем общий уровень, затем загрузка из базы.
+
+    Ключи версионируются ревизией данных (см. services/revision.py), поэтому изменение
+    заметок не требует удалять записи ни в одном воркере: старые ключи просто перестают
+    запрашиваться и вытесняются. Одновременные промахи по одному ключу ждут одну загрузку.
+    """
+
+    def __init__(self, local: CacheBackend, shared: CacheBackend | None, ttl: float):
+        self._local = local
+        self._shared = shared
+        self._ttl = ttl
+        self._flight = SingleFlight("response_cache")
+        self.hits = 0
+        self.misses = 0
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[bytes]]) -> bytes:
+        value = await self._local.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        return await self._flight.do(key, lambda: self._load(key, loader))
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[bytes]]) -> bytes:
+        value = await self._shared.get(key) if self._shared is not None else None
+        if value is None:
+            self.misses += 1
+            value = await loader()
+            if self._shared is not None:
+                await self._shared.set(key, value, self._ttl)
+        else:
+            self.hits += 1
+        await self._local.set(key, value, self._ttl)
+        return value
+
+    async def close(self):
+        if isinstance(self._shared, RedisBackend):
+            await self._shared.close()
+
+
+def _shared_backend() -> CacheBackend | None:
+    if not settings.CACHE_BACKEND_URL:
+        return None
+    if redis is None:
+        logger.warning("CACHE_BACKEND_URL задан, но пакет redis не установлен; общий кэш отключен")
+        return None
+    return RedisBackend(settings.CACHE_BACKEND_URL)
+
+
+response_cache = ResponseCache(
+    local=InMemoryBackend(settings.CACHE_LOCAL_MAX_BYTES),
+    shared=_shared_backend(),
+    ttl=settings.CACHE_TTL,
+)
@@ -0,0 +1,316 @@
+import csv
+import io
+import re
+import zipfile
+import zlib
+from xml.sax.saxutils import escape, quoteattr
+
+import orjson
+
+try:
+    import zstandard
+except ImportError:  # zstd - необязательная зависимость
+    zstandard = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # parquet - необязательная зависимость
+    pyarrow = None
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Excel не хранит в ячейке больше 32767 символов и не принимает управляющие символы XML 1.0
+XLSX_MAX_CELL_LENGTH = 32767
+XLSX_MAX_COLUMN_WIDTH = 255
+_ILLEGAL_XML_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name={name} sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+
+class _ChunkSink:
+    """Файлоподобный приемник для zipfile: копит записанные байты до следующего drain().
+
+    Метода seek нет, поэтому zipfile пишет архив потоково, с дескрипторами данных
+    после каждого файла, и уже отданные клиенту байты никогда не переписываются.
+    """
+
+    closed = False
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def writable(self) -> bool:
+        return True
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _column_letter(index: int) -> str:
+    letters = ""
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+class XlsxStreamWriter:
+    """Потоковая запись книги XLSX с одним листом.
+
+    Строки сжимаются и отдаются по мере поступления, в памяти держится только текущая
+    порция. Ширины столбцов в XLSX пишутся перед данными листа, поэтому их нужно знать
+    заранее (в services.note они оцениваются по первой порции строк).
+    """
+
+    def __init__(self, sheet_name: str, widths: list[int]):
+        self._sheet_name = sheet_name
+        self._widths = widths
+        self._letters = [_column_letter(i) for i in range(1, len(widths) + 1)]
+        self._sink = _ChunkSink()
+        self._zip = zipfile.ZipFile(self._sink, "w", compression=zipfile.ZIP_DEFLATED)
+        self._sheet = None
+        self._row = 0
+
+    def start(self, headers: list[str]) -> bytes:
+        self._zip.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        self._zip.writestr("_rels/.rels", _ROOT_RELS)
+        self._zip.writestr("xl/workbook.xml", _WORKBOOK.format(name=quoteattr(self._sheet_name)))
+        self._zip.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+        self._sheet = self._zip.open("xl/worksheets/sheet1.xml", "w", force_zip64=True)
+        cols = "".join(
+            f'<col min="{i}" max="{i}" width="{min(width, XLSX_MAX_COLUMN_WIDTH)}" customWidth="1"/>'
+            for i, width in enumerate(self._widths, 1)
+        )
+        self._sheet.write((
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            f'<cols>{cols}</cols><sheetData>'
+        ).encode())
+        return self.write_rows([headers])
+
+    def write_rows(self, rows) -> bytes:
+        parts = []
+        for values in rows:
+            self._row += 1
+            parts.append(f'<row r="{self._row}">')
+            for letter, value in zip(self._letters, values):
+                if value is None:
+                    continue
+                ref = f"{letter}{self._row}"
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    parts.append(f'<c r="{ref}"><v>{value}</v></c>')
+                else:
+                    text = escape(_ILLEGAL_XML_CHARS.sub("", str(value))[:XLSX_MAX_CELL_LENGTH])
+                    parts.append(f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+            parts.append("</row>")
+        self._sheet.write("".join(parts).encode())
+        return self._sink.drain()
+
+    def finish(self) -> bytes:
+        self._sheet.write(b"</sheetData></worksheet>")
+        self._sheet.close()
+        self._zip.close()
+        return self._sink.drain()
+
+
+# Поля записи для выгрузок данных; порядок задает столбцы CSV и схему Parquet
+EXPORT_FIELDS = ["id", "title", "description", "is_archive", "tag_ids", "tags", "created_at", "updated_at"]
+
+
+class CsvStreamWriter:
+    media_type = "text/csv; charset=utf-8"
+    extension = "csv"
+
+    def __init__(self):
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+
+    def _drain(self) -> bytes:
+        data = self._buffer.getvalue().encode()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+    def start(self) -> bytes:
+        self._writer.writerow(EXPORT_FIELDS)
+        return self._drain()
+
+    def write_rows(self, records: list[dict]) -> bytes:
+        self._writer.writerows(
+            [
+                record["id"],
+                record["title"],
+                record["description"],
+                record["is_archive"],
+                ";".join(map(str, record["tag_ids"])),
+                ";".join(record["tags"]),
+                record["created_at"].isoformat(),
+                record["updated_at"].isoformat(),
+            ]
+            for record in records
+        )
+        return self._drain()
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class NdjsonStreamWriter:
+    media_type = "application/x-ndjson"
+    extension = "ndjson"
+
+    def start(self) -> bytes:
+        return b""
+
+    def write_rows(self, records: list[dict]) -> bytes:
+        return b"".join(orjson.dumps(record) + b"\n" for record in records)
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class ParquetStreamWriter:
+    """Каждая порция строк становится отдельной row group, footer пишется в finish()"""
+    media_type = "application/vnd.apache.parquet"
+    extension = "parquet"
+
+    def __init__(self):
+        self._sink = _ChunkSink()
+        self._schema = pyarrow.schema([
+            ("id", pyarrow.int64()),
+            ("title", pyarrow.string()),
+            ("description", pyarrow.string()),
+            ("is_archive", pyarrow.bool_()),
+            ("tag_ids", pyarrow.list_(pyarrow.int64())),
+            ("tags", pyarrow.list_(pyarrow.string())),
+            ("created_at", pyarrow.timestamp("us", tz="UTC")),
+            ("updated_at", pyarrow.timestamp("us", tz="UTC")),
+        ])
+        self._writer = pyarrow.parquet.ParquetWriter(self._sink, self._schema, compression="zstd")
+
+    def start(self) -> bytes:
+        return self._sink.drain()
+
+    def write_rows(self, records: list[dict]) -> bytes:
+        if records:
+            self._writer.write_table(pyarrow.Table.from_pylist(records, schema=self._schema))
+        return self._sink.drain()
+
+    def finish(self) -> bytes:
+        self._writer.close()
+        return self._sink.drain()
+
+
+DATA_WRITERS = {
+    "csv": CsvStreamWriter,
+    "ndjson": NdjsonStreamWriter,
+    "parquet": ParquetStreamWriter,
+}
+
+
+def writer_available(fmt: str) -> bool:
+    return fmt != "parquet" or pyarrow is not None
+
+
+class _GzipEncoder:
+    name = "gzip"
+
+    def __init__(self):
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _ZstdEncoder:
+    name = "zstd"
+
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=3).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+
+def choose_encoder(accept_encoding: str | None):
+    """Кодировщик ответа по Accept-Encoding: zstd (если установлен), затем gzip, иначе без сжатия"""
+    accepted = set()
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(coding.strip().lower())
+    if zstandard is not None and "zstd" in accepted:
+        return _ZstdEncoder()
+    if "gzip" in accepted or "*" in accepted:
+        return _GzipEncoder()
+    return None
+
+
+async def encode_stream(chunks, encoder):
+    """Сжатие потока на лету; пустые порции не отправляются"""
+    async for chunk in chunks:
+        data = encoder.compress(chunk) if encoder is not None else chunk
+        if data:
+            yield data
+    if encoder is not None:
+        tail = encoder.flush()
+        if tail:
+            yield tail
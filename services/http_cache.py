@@ -0,0 +1,55 @@
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Response
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Проверка заголовка If-None-Match (слабое сравнение, как требует RFC 9110 для GET)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+def make_etag(prefix: str, *parts) -> str:
+    """Сильный ETag из частей отпечатка: ревизий, версий справочников и параметров запроса"""
+    digest = hashlib.sha256("\x1f".join(map(str, parts)).encode()).hexdigest()[:32]
+    return f'"{prefix}-{digest}"'
+
+
+@dataclass(frozen=True)
+class Validators:
+    """Валидаторы представления для условного GET"""
+    etag: str
+    last_modified: datetime
+
+    def headers(self) -> dict:
+        # Ответы персональные: общие кэши их не хранят, браузер переспрашивает каждый раз
+        return {
+            "ETag": self.etag,
+            "Last-Modified": format_datetime(self.last_modified, usegmt=True),
+            "Cache-Control": "private, no-cache",
+        }
+
+    def not_modified(self, if_none_match: str | None, if_modified_since: str | None) -> bool:
+        # If-Modified-Since учитывается, только если клиент не прислал If-None-Match (RFC 9110)
+        if if_none_match:
+            return etag_matches(if_none_match, self.etag)
+        if not if_modified_since:
+            return False
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            return False
+        # HTTP-дата точна до секунды
+        return self.last_modified.replace(microsecond=0) <= since
+
+    def not_modified_response(self) -> Response:
+        return Response(status_code=304, headers=self.headers())
@@ -0,0 +1,29 @@
+"""Метрики, которые читаются из уже существующих счетчиков компонентов при каждом сборе"""
+from database.database import pool_status
+from metrics import Counter, Gauge
+from security import password_pool, token_cache
+from services.cache import response_cache
+from services.notifications import change_broker
+from services.singleflight import flights
+
+Counter("db_pool_checkouts_total", "Выдачи соединений из пула", callback=lambda: pool_status()["checkouts"])
+Counter("db_pool_timeouts_total", "Таймауты ожидания соединения из пула", callback=lambda: pool_status()["timeouts"])
+Gauge("db_pool_checked_out", "Соединения, выданные из пула", callback=lambda: pool_status()["checked_out"])
+Gauge("db_pool_overflow", "Соединения сверх pool_size", callback=lambda: pool_status()["overflow"])
+
+Gauge("password_hash_in_flight", "Хэши паролей, считающиеся сейчас", callback=lambda: password_pool.in_flight)
+Gauge("password_hash_waiting", "Запросы в очереди на хэширование", callback=lambda: password_pool.waiting)
+Counter("password_hash_completed_total", "Посчитанные хэши паролей", callback=lambda: password_pool.completed)
+Counter("password_hash_rejected_total", "Отказы из-за переполненной очереди", callback=lambda: password_pool.rejected)
+
+Gauge("auth_token_cache_entries", "Записи в кэше проверенных токенов", callback=lambda: len(token_cache))
+
+Counter("response_cache_hits_total", "Попадания в кэш ответов", callback=lambda: response_cache.hits)
+Counter("response_cache_misses_total", "Промахи кэша ответов", callback=lambda: response_cache.misses)
+
+Counter("singleflight_executed_total", "Выполненные вызовы", ("name",),
+        callback=lambda: {(flight.name,): flight.executed for flight in flights})
+Counter("singleflight_coalesced_total", "Вызовы, дождавшиеся чужого результата", ("name",),
+        callback=lambda: {(flight.name,): flight.coalesced for flight in flights})
+
+Gauge("notes_stream_subscribers", "Открытые потоки изменений заметок", callback=lambda: change_broker.subscribers)
@@ -1,140 +1,349 @@
 from fastapi import HTTPException, status
 
-from database.base_crud import BaseCRUD
-from dto.note_dto import NoteCreateRequest, NoteResponse, TagResponse, NoteUpdateRequest
-from models.notes import Note, NotesTags
-from security import decode_access_token
-from database.database import async_session_maker
-from sqlalchemy import select, delete
-from sqlalchemy.orm import joinedload
-from io import BytesIO
+from database.base_crud import BaseCRUD, any_of
+from dto.note_dto import (
+    NoteCreateRequest, NoteResponse, TagResponse, NoteUpdateRequest, PageResponse, NoteSearchResult,
+    NoteBatchRequest, NoteBatchResponse, NoteBatchResult, NoteChangesResponse
+)
+from models.notes import Note, NotesTags, NoteTombstone
+from database.database import async_session_maker, session_scope
+from services.cache import response_cache
+from services.export import (
+    XlsxStreamWriter, XLSX_MEDIA_TYPE, DATA_WRITERS, writer_available, choose_encoder, encode_stream
+)
+from services.http_cache import Validators, make_etag
+from services.notifications import stream_events
+from services.pagination import encode_cursor, decode_cursor, int32, int64, finite_float, timestamp
+from services.revision import bump_revision, get_revision, NoteTombstoneCRUD
+from services.serialization import note_to_dict, note_summary_to_dict, json_response, encode_json
+from services.tag import tag_registry
+from security import create_stream_ticket
+from settings import settings
+from sqlalchemy import (
+    select, insert, update, delete, exists, tuple_, func, values, column, literal_column, union_all, null,
+    true, false, Integer, String
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime
-from openpyxl import Workbook
 from fastapi.responses import StreamingResponse
 
+EXPORT_HEADERS = ["ID", "Заголовок", "Описание", "Теги", "Дата создания", "Дата обновления"]
+EXPORT_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Ширина столбца XLSX в символах не больше этой: длинные описания все равно переносятся
+EXPORT_MAX_COLUMN_WIDTH = 80
+# Фильтр ?tags= длиннее этого отклоняется: каждый id - отдельное условие в запросе
+FILTER_MAX_TAGS = 50
+
+SEARCH_CONFIGS = [literal_column("'russian'::regconfig"), literal_column("'english'::regconfig")]
+SEARCH_HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxWords=35, MinWords=15, MaxFragments=2"
+
 
 class NoteCRUD(BaseCRUD):
     model = Note
+    # Поля NoteResponse: списки читают строки столбцов, без ORM-объектов и identity map
+    response_columns = (Note.id, Note.title, Note.user_id, Note.description, Note.is_archive,
+                        Note.created_at, Note.updated_at)
+    # Поля NoteSummaryResponse: превью и длина хранятся в таблице, описание целиком не читается
+    summary_columns = (Note.id, Note.title, Note.user_id, Note.description_preview, Note.description_length,
+                       Note.is_archive, Note.created_at, Note.updated_at)
 
     @classmethod
-    async def get_all(cls, user_id: int):
-        async with async_session_maker() as session:
+    async def get_list(cls, user_id: int, is_archive: bool, limit: int | None = None,
+                       after: tuple[datetime, int] | None = None,
+                       tag_ids: list[int] | None = None, match: str = "any"):
+        """Заметки пользователя в порядке (created_at desc, id desc), начиная после ключа after.
+
+        tag_ids оставляет заметки хотя бы с одним (match="any") или со всеми (match="all")
+        из перечисленных тегов.
+
+        Возвращает пару (строки заметок, теги-словари по id заметки): теги догружаются
+        вторым запросом, а не join-ом, чтобы строка заметки не повторялась на каждый тег.
+        """
+        async with session_scope() as session:
             query = (
-                select(cls.model)
-                .options(joinedload(cls.model.tags).joinedload(NotesTags.tag))
-                .where(cls.model.user_id == user_id, cls.model.is_archive == False)
-                .order_by(cls.model.created_at.desc())
+                select(*cls.summary_columns)
+                .where(cls.model.user_id == user_id, cls.model.is_archive == is_archive)
+                .order_by(cls.model.created_at.desc(), cls.model.id.desc())
             )
-            res = await session.execute(query)
-            return res.unique().scalars().all()
+            if after is not None:
+                query = query.where(tuple_(cls.model.created_at, cls.model.id) < after)
+            if tag_ids:
+                query = query.where(cls._tags_filter(tag_ids, match))
+            if limit is not None:
+                query = query.limit(limit)
+            notes = (await session.execute(query)).all()
+            return notes, await NoteTagsCRUD.get_tags_map(session, [note.id for note in notes], as_dicts=True)
 
     @classmethod
-    async def get_all_archive(cls, user_id: int):
-        async with async_session_maker() as session:
-            query = (
-                select(cls.model)
-                .options(joinedload(cls.model.tags).joinedload(NotesTags.tag))
-                .where(cls.model.user_id == user_id, cls.model.is_archive == True)
-                .order_by(cls.model.created_at.desc())
-            )
-            res = await session.execute(query)
-            return res.unique().scalars().all()
+    def _tags_filter(cls, tag_ids: list[int], match: str):
+        # Оба варианта - коррелированные подзапросы по уникальному индексу (note_id, tag_id)
+        links = (NotesTags.note_id == cls.model.id, any_of(NotesTags.tag_id, tag_ids))
+        if match == "all":
+            matched = select(func.count()).select_from(NotesTags).where(*links).scalar_subquery()
+            return matched == len(tag_ids)
+        return exists().where(*links)
 
+    @classmethod
+    async def get_all(cls, user_id: int, limit: int | None = None, after: tuple[datetime, int] | None = None,
+                      tag_ids: list[int] | None = None, match: str = "any"):
+        return await cls.get_list(user_id, is_archive=False, limit=limit, after=after, tag_ids=tag_ids, match=match)
 
     @classmethod
-    async def get_one(cls, note_id: int):
-        async with async_session_maker() as session:
+    async def get_all_archive(cls, user_id: int, limit: int | None = None,
+                              after: tuple[datetime, int] | None = None,
+                              tag_ids: list[int] | None = None, match: str = "any"):
+        return await cls.get_list(user_id, is_archive=True, limit=limit, after=after, tag_ids=tag_ids, match=match)
+
+    @classmethod
+    async def get_one(cls, note_id: int, user_id: int):
+        async with session_scope() as session:
+            query = select(*cls.response_columns).where(cls.model.id == note_id, cls.model.user_id == user_id)
+            note = (await session.execute(query)).one_or_none()
+            if note is None:
+                return None, []
+            tags_map = await NoteTagsCRUD.get_tags_map(session, [note.id], as_dicts=True)
+            return note, tags_map.get(note.id, [])
+
+    @classmethod
+    async def get_version(cls, note_id: int, user_id: int):
+        """Ревизия и время изменения заметки пользователя для условного GET - поиск по первичному ключу"""
+        async with session_scope() as session:
             query = (
-                select(cls.model)
-                .options(joinedload(cls.model.tags).joinedload(NotesTags.tag))
-                .where(cls.model.id == note_id)
+                select(cls.model.revision, cls.model.updated_at)
+                .where(cls.model.id == note_id, cls.model.user_id == user_id)
             )
-            res = await session.execute(query)
-            return res.unique().scalar_one_or_none()
+            return (await session.execute(query)).one_or_none()
+
+    @classmethod
+    async def search(cls, user_id: int, text: str, limit: int, after: tuple[float, datetime, int] | None = None):
+        """Полнотекстовый поиск по заметкам пользователя в порядке (rank desc, created_at desc, id desc).
+
+        Сначала по GIN-индексу выбирается страница id с рангом, и только для нее
+        считаются подсвеченные фрагменты: ts_headline дорогой.
+        """
+        ts_query = func.websearch_to_tsquery(SEARCH_CONFIGS[0], text).op("||")(
+            func.websearch_to_tsquery(SEARCH_CONFIGS[1], text)
+        )
+        rank = func.ts_rank_cd(cls.model.search_vector, ts_query)
+        page = (
+            select(cls.model.id, rank.label("rank"))
+            .where(cls.model.user_id == user_id, cls.model.search_vector.op("@@")(ts_query))
+            .order_by(rank.desc(), cls.model.created_at.desc(), cls.model.id.desc())
+            .limit(limit)
+        )
+        if after is not None:
+            page = page.where(tuple_(rank, cls.model.created_at, cls.model.id) < after)
+        page = page.subquery()
+        snippet = func.ts_headline(
+            SEARCH_CONFIGS[0], func.coalesce(cls.model.description, ""), ts_query, SEARCH_HEADLINE_OPTIONS
+        )
+        # Описание целиком не отдается: только превью и подсвеченный фрагмент
+        query = (
+            select(*cls.summary_columns, page.c.rank, snippet.label("snippet"))
+            .join(page, page.c.id == cls.model.id)
+            .order_by(page.c.rank.desc(), cls.model.created_at.desc(), cls.model.id.desc())
+        )
+        async with session_scope() as session:
+            rows = (await session.execute(query)).all()
+            return rows, await NoteTagsCRUD.get_tags_map(session, [row.id for row in rows])
+
+    @classmethod
+    async def get_changes(cls, user_id: int, limit: int, after: tuple[int, int] | None = None):
+        """Изменения заметок пользователя после ключа (ревизия, id) в порядке этого ключа.
+
+        Измененные заметки и следы удаленных читаются одним UNION ALL, то есть из одного
+        снимка базы: иначе коммит между двумя запросами мог бы отдать часть ревизии.
+        Без after (первая синхронизация) следы удаленных не нужны.
+        """
+        changed = select(
+            cls.model.id, cls.model.revision, cls.model.user_id, cls.model.title, cls.model.description,
+            cls.model.is_archive, cls.model.created_at, cls.model.updated_at, false().label("deleted"),
+        ).where(cls.model.user_id == user_id)
+        if after is None:
+            changes = changed.subquery()
+        else:
+            changed = changed.where(tuple_(cls.model.revision, cls.model.id) > after)
+            deleted = select(
+                NoteTombstone.note_id, NoteTombstone.revision, NoteTombstone.user_id,
+                null(), null(), null(), null(), null(), true(),
+            ).where(NoteTombstone.user_id == user_id, tuple_(NoteTombstone.revision, NoteTombstone.note_id) > after)
+            changes = union_all(changed, deleted).subquery()
+        query = select(changes).order_by(changes.c.revision, changes.c.id).limit(limit)
+        async with session_scope() as session:
+            rows = (await session.execute(query)).all()
+            return rows, await NoteTagsCRUD.get_tags_map(session, [row.id for row in rows if not row.deleted])
+
+    # Пакетные операции внутри переданной сессии; коммит делает вызывающий код
+    @classmethod
+    async def get_owners(cls, session, note_ids) -> dict[int, int]:
+        """Владельцы заметок одним запросом: id заметки -> user_id"""
+        if not note_ids:
+            return {}
+        query = select(cls.model.id, cls.model.user_id).where(any_of(cls.model.id, note_ids))
+        return dict((await session.execute(query)).all())
+
+    @classmethod
+    async def insert_many(cls, session, rows: list[dict]) -> list[int]:
+        """Многострочный INSERT ... VALUES ... RETURNING id в порядке rows"""
+        if not rows:
+            return []
+        query = insert(cls.model).returning(cls.model.id, sort_by_parameter_order=True)
+        return list((await session.execute(query, rows)).scalars())
+
+    @classmethod
+    async def update_owned(cls, session, note_id: int, user_id: int, **data):
+        """UPDATE ... RETURNING: обновленная заметка или None, если заметки нет или она чужая"""
+        query = (
+            update(cls.model)
+            .where(cls.model.id == note_id, cls.model.user_id == user_id)
+            .values(**data)
+            .returning(cls.model)
+            .execution_options(synchronize_session=False)
+        )
+        return (await session.execute(query)).scalar_one_or_none()
+
+    @classmethod
+    async def update_many(cls, session, rows: list[dict], revision: int):
+        """UPDATE ... FROM (VALUES ...): разные значения для многих заметок одним запросом"""
+        if not rows:
+            return
+        data = values(
+            column("id", Integer), column("title", String), column("description", String), name="data"
+        ).data([(row["id"], row["title"], row["description"]) for row in rows])
+        query = (
+            update(cls.model)
+            .where(cls.model.id == data.c.id)
+            .values(title=data.c.title, description=data.c.description, revision=revision)
+            .execution_options(synchronize_session=False)
+        )
+        await session.execute(query)
+
+    @classmethod
+    async def set_archive_many(cls, session, note_ids, is_archive: bool, revision: int):
+        if not note_ids:
+            return
+        query = (
+            update(cls.model)
+            .where(any_of(cls.model.id, note_ids))
+            .values(is_archive=is_archive, revision=revision)
+            .execution_options(synchronize_session=False)
+        )
+        await session.execute(query)
+
+    @classmethod
+    async def delete_many(cls, session, note_ids):
+        if not note_ids:
+            return
+        query = delete(cls.model).where(any_of(cls.model.id, note_ids)).execution_options(synchronize_session=False)
+        await session.execute(query)
+
+    @classmethod
+    def _export_filter(cls, user_id: int, include_archived: bool = False, since: datetime | None = None):
+        conditions = [cls.model.user_id == user_id]
+        if not include_archived:
+            conditions.append(cls.model.is_archive == False)
+        if since is not None:
+            conditions.append(cls.model.updated_at > since)
+        return conditions
+
+    @classmethod
+    async def stream_export(cls, session, user_id: int, chunk_size: int,
+                            include_archived: bool = False, since: datetime | None = None):
+        """Заметки для выгрузки порциями из серверного курсора, теги - массивом id.
+
+        Выгрузка с since идет в порядке (updated_at, id), чтобы клиент мог взять
+        updated_at последней строки как since для следующей инкрементальной выгрузки.
+        """
+        tag_ids = (
+            select(func.array_agg(NotesTags.tag_id))
+            .where(NotesTags.note_id == cls.model.id)
+            .scalar_subquery()
+            .label("tag_ids")
+        )
+        if since is not None:
+            order_by = (cls.model.updated_at, cls.model.id)
+        else:
+            order_by = (cls.model.created_at.desc(), cls.model.id.desc())
+        query = (
+            select(cls.model.id, cls.model.title, cls.model.description, cls.model.is_archive, tag_ids,
+                   cls.model.created_at, cls.model.updated_at)
+            .where(*cls._export_filter(user_id, include_archived, since))
+            .order_by(*order_by)
+            .execution_options(yield_per=chunk_size)
+        )
+        result = await session.stream(query)
+        async for rows in result.partitions():
+            yield rows
 
 
 class NoteTagsCRUD(BaseCRUD):
     model = NotesTags
 
     @classmethod
-    async def delete_many(cls, note_id):
-        async with async_session_maker() as session:
-            async with session.begin():
-                await session.execute(
-                    delete(cls.model).where(cls.model.note_id == note_id)
-                )
-            await session.commit()
-
-
-async def get_all_my(token: str):
-    payload = decode_access_token(token)
-    if payload is None:
-        raise HTTPException(status_code=401, detail="Не валидный токен")
-
-    user_id = payload.get("sub")
-    if not isinstance(user_id, str) or not user_id:
-        raise HTTPException(status_code=401, detail="Не валидный токен")
-
-    notes = await NoteCRUD.get_all(user_id=int(user_id))
-    return [
-        NoteResponse(
-            id=note.id,
-            title=note.title,
-            user_id=note.user_id,
-            description=note.description,
-            is_archive=note.is_archive,
-            created_at=note.created_at,
-            updated_at=note.updated_at,
-            tags=[
-                TagResponse(
-                    id=note_tag.tag.id,
-                    name=note_tag.tag.name,
-                    color=note_tag.tag.color,
-                )
-                for note_tag in note.tags
-            ]
+    async def get_tags_map(cls, session, note_ids: list[int], as_dicts: bool = False) -> dict[int, list]:
+        """Теги для набора заметок: связи одним запросом, сами теги из справочника в памяти.
+
+        as_dicts=True отдает теги словарями для note_to_dict, иначе - TagResponse.
+        """
+        if not note_ids:
+            return {}
+        query = (
+            select(cls.model.note_id, cls.model.tag_id)
+            .where(any_of(cls.model.note_id, note_ids))
+            .order_by(cls.model.id)
         )
-        for note in notes
-    ]
-
-
-async def get_all_my_archives(token: str):
-    payload = decode_access_token(token)
-    if payload is None:
-        raise HTTPException(status_code=401, detail="Не валидный токен")
-
-    user_id = payload.get("sub")
-    if not isinstance(user_id, str) or not user_id:
-        raise HTTPException(status_code=401, detail="Не валидный токен")
-
-    notes = await NoteCRUD.get_all_archive(user_id=int(user_id))
-    return [
-        NoteResponse(
-            id=note.id,
-            title=note.title,
-            user_id=note.user_id,
-            description=note.description,
-            is_archive=note.is_archive,
-            created_at=note.created_at,
-            updated_at=note.updated_at,
-            tags=[
-                TagResponse(
-                    id=note_tag.tag.id,
-                    name=note_tag.tag.name,
-                    color=note_tag.tag.color,
-                )
-                for note_tag in note.tags
-            ]
+        links = (await session.execute(query)).all()
+        tag_ids = {tag_id for _, tag_id in links}
+        tags = await (tag_registry.resolve_dicts(tag_ids) if as_dicts else tag_registry.resolve(tag_ids))
+        tags_map: dict[int, list] = {}
+        for note_id, tag_id in links:
+            tag = tags.get(tag_id)
+            if tag is not None:
+                tags_map.setdefault(note_id, []).append(tag)
+        return tags_map
+
+    @classmethod
+    async def insert_links(cls, session, links: list[tuple[int, int]]):
+        """Связи заметка-тег одним многострочным INSERT; уже существующие пропускаются"""
+        if not links:
+            return
+        query = pg_insert(cls.model).on_conflict_do_nothing(index_elements=["note_id", "tag_id"])
+        try:
+            await session.execute(query, [{"note_id": note_id, "tag_id": tag_id} for note_id, tag_id in links])
+        except IntegrityError:
+            # Тег удален в другом воркере, а справочник этого процесса еще не перечитан
+            tag_registry.invalidate()
+            raise HTTPException(status_code=422, detail="Неизвестный тег")
+
+    @classmethod
+    async def delete_for_notes(cls, session, note_ids):
+        if not note_ids:
+            return
+        query = (
+            delete(cls.model)
+            .where(any_of(cls.model.note_id, note_ids))
+            .execution_options(synchronize_session=False)
         )
-        for note in notes
-    ]
+        await session.execute(query)
 
+    @classmethod
+    async def replace_tags(cls, session, note_id: int, tag_ids: list[int]):
+        """Приводит теги заметки к tag_ids, трогая только изменившиеся связи"""
+        existing = set((await session.execute(
+            select(cls.model.tag_id).where(cls.model.note_id == note_id)
+        )).scalars())
+        removed = existing.difference(tag_ids)
+        if removed:
+            await session.execute(
+                delete(cls.model)
+                .where(cls.model.note_id == note_id, any_of(cls.model.tag_id, removed))
+                .execution_options(synchronize_session=False)
+            )
+        await cls.insert_links(session, [(note_id, tag_id) for tag_id in tag_ids if tag_id not in existing])
 
-async def get_by_id(note_id: int) -> NoteResponse:
-    note = await NoteCRUD.get_one(note_id)
-    if not note:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
+def _to_response(note: Note, tags: list[TagResponse]) -> NoteResponse:
     return NoteResponse(
         id=note.id,
         title=note.title,
@@ -143,165 +352,409 @@ async def get_by_id(note_id: int) -> NoteResponse:
         is_archive=note.is_archive,
         created_at=note.created_at,
         updated_at=note.updated_at,
-        tags=[
-            TagResponse(
-                id=note_tag.tag.id,
-                name=note_tag.tag.name,
-                color=note_tag.tag.color,
-            )
-            for note_tag in note.tags
-        ]
+        tags=tags,
     )
 
 
-async def create_note(data: NoteCreateRequest, token: str):
-    payload = decode_access_token(token)
-    if payload is None:
-        raise HTTPException(status_code=401, detail="Не валидный токен")
+def _parse_cursor(cursor: str | None) -> tuple[datetime, int] | None:
+    if cursor is None:
+        return None
+    return decode_cursor(cursor, timestamp, int32)
+
+
+def _page_body(notes, tags_map: dict[int, list[dict]], limit: int) -> bytes:
+    """Страница PageResponse[NoteSummaryResponse] сразу в JSON, минуя модели pydantic"""
+    # Запрашиваем limit + 1 строку: лишняя строка означает, что есть следующая страница
+    page = notes[:limit]
+    next_cursor = None
+    if len(notes) > limit:
+        next_cursor = encode_cursor(page[-1].created_at, page[-1].id)
+    return encode_json({
+        "items": [note_summary_to_dict(note, tags_map.get(note.id, [])) for note in page],
+        "next_cursor": next_cursor,
+    })
+
+
+def _parse_tags(tags: str | None) -> list[int] | None:
+    if not tags:
+        return None
+    raw_ids = [tag_id for tag_id in tags.split(",") if tag_id.strip()]
+    if len(raw_ids) > FILTER_MAX_TAGS:
+        raise HTTPException(status_code=400, detail=f"Не больше {FILTER_MAX_TAGS} тегов в фильтре")
+    try:
+        # id вне диапазона Integer дошел бы до базы и закончился ошибкой 500
+        tag_ids = list(dict.fromkeys(int32(int(tag_id)) for tag_id in raw_ids))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный список тегов")
+    return tag_ids or None
+
+
+async def _validators(kind: str, revision: int, changed_at: datetime, *params) -> Validators:
+    """Валидаторы ответа с заметками: ревизия данных, версия справочника тегов и параметры запроса"""
+    catalogue = await tag_registry.get()
+    last_modified = changed_at
+    if catalogue.last_modified is not None:
+        last_modified = max(last_modified, catalogue.last_modified)
+    return Validators(etag=make_etag(kind, revision, catalogue.etag, *params), last_modified=last_modified)
+
+
+async def _list_validators(user_id: int, kind: str, *params) -> Validators | None:
+    version = await get_revision(user_id)
+    if version is None:
+        return None
+    revision, changed_at = version
+    return await _validators(kind, revision, changed_at, user_id, *params)
+
+
+async def _cached(validators: Validators | None, loader) -> bytes:
+    """Тело ответа из кэша по ETag: он уже включает ревизию данных, версию тегов и параметры.
+
+    Ревизия читается раньше данных, поэтому под ключом ревизии может оказаться только
+    более новое содержимое, но не устаревшее.
+    """
+    if validators is None:
+        return await loader()
+    return await response_cache.get_or_load(validators.etag, loader)
+
+
+async def _list_response(crud_method, kind: str, user_id: int, limit: int, cursor: str | None,
+                         tags: str | None, match: str, if_none_match: str | None, if_modified_since: str | None):
+    after, tag_ids = _parse_cursor(cursor), _parse_tags(tags)
+    # Пока ревизия пользователя не менялась, ответ тот же: 304 после одного запроса по ключу
+    validators = await _list_validators(user_id, kind, limit, cursor, tags, match)
+    if validators and validators.not_modified(if_none_match, if_modified_since):
+        return validators.not_modified_response()
+
+    async def load() -> bytes:
+        notes, tags_map = await crud_method(user_id=user_id, limit=limit + 1, after=after,
+                                            tag_ids=tag_ids, match=match)
+        return _page_body(notes, tags_map, limit)
+
+    return json_response(await _cached(validators, load), headers=validators.headers() if validators else None)
+
+
+async def get_all_my(user_id: int, limit: int, cursor: str | None = None,
+                     tags: str | None = None, match: str = "any",
+                     if_none_match: str | None = None, if_modified_since: str | None = None):
+    return await _list_response(NoteCRUD.get_all, "notes-summary", user_id, limit, cursor, tags, match,
+                                if_none_match, if_modified_since)
+
+
+async def get_all_my_archives(user_id: int, limit: int, cursor: str | None = None,
+                              tags: str | None = None, match: str = "any",
+                              if_none_match: str | None = None, if_modified_since: str | None = None):
+    return await _list_response(NoteCRUD.get_all_archive, "archives-summary", user_id, limit, cursor, tags, match,
+                                if_none_match, if_modified_since)
+
+
+def _parse_revision_cursor(cursor: str | None) -> tuple[int, int] | None:
+    if cursor is None:
+        return None
+    return decode_cursor(cursor, int64, int32)
+
+
+async def get_changes(user_id: int, limit: int, since: str | None = None) -> NoteChangesResponse:
+    rows, tags_map = await NoteCRUD.get_changes(user_id, limit + 1, _parse_revision_cursor(since))
+    page = rows[:limit]
+    if page:
+        watermark = encode_cursor(page[-1].revision, page[-1].id)
+    else:
+        watermark = since or encode_cursor(0, 0)
+    return NoteChangesResponse(
+        notes=[_to_response(row, tags_map.get(row.id, [])) for row in page if not row.deleted],
+        deleted=[row.id for row in page if row.deleted],
+        watermark=watermark,
+        has_more=len(rows) > limit,
+    )
 
-    user_id = payload.get("sub")
-    if not isinstance(user_id, str) or not user_id:
-        raise HTTPException(status_code=401, detail="Не валидный токен")
 
-    note_id = await NoteCRUD.create_and_return_id(user_id=int(user_id), title=data.title, description=data.description)
+def stream_ticket(user_id: int):
+    return {"ticket": create_stream_ticket(user_id), "expires_in": settings.NOTES_STREAM_TICKET_TTL}
 
-    if data.noteTags:
-        for tag_id in data.noteTags:
-            await NoteTagsCRUD.create(note_id=note_id, tag_id=tag_id)
 
-    return {"ok": True, "note_id": note_id}
+async def stream_changes(user_id: int):
+    # Прокси не должны буферизовать поток событий
+    return StreamingResponse(
+        stream_events(user_id, settings.NOTES_STREAM_HEARTBEAT),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
-async def delete_by_id(note_id: int, token: str):
-    payload = decode_access_token(token)
-    if payload is None:
-        raise HTTPException(status_code=401, detail="Не валидный токен")
+async def search(user_id: int, text: str, limit: int, cursor: str | None = None) -> PageResponse[NoteSearchResult]:
+    after = None
+    if cursor is not None:
+        after = decode_cursor(cursor, finite_float, timestamp, int32)
+
+    rows, tags_map = await NoteCRUD.search(user_id, text, limit + 1, after)
+    page = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = page[-1]
+        next_cursor = encode_cursor(last.rank, last.created_at, last.id)
+    return PageResponse[NoteSearchResult](
+        items=[
+            NoteSearchResult(**note_summary_to_dict(row, tags_map.get(row.id, [])), rank=row.rank, snippet=row.snippet)
+            for row in page
+        ],
+        next_cursor=next_cursor,
+    )
 
-    user_id = payload.get("sub")
-    if not isinstance(user_id, str) or not user_id:
-        raise HTTPException(status_code=401, detail="Не валидный токен")
 
-    note = await NoteCRUD.find_by_id(model_id=note_id)
-    if note is None:
-        raise HTTPException(status_code=404, detail="Запись не найдена")
-    if note.user_id != int(user_id):
-        raise HTTPException(status_code=403, detail="Изменения не доступны")
+async def get_by_id(note_id: int, user_id: int,
+                    if_none_match: str | None = None, if_modified_since: str | None = None):
+    # Чужая заметка неотличима от несуществующей
+    version = await NoteCRUD.get_version(note_id, user_id)
+    if not version:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    revision, updated_at = version
+    validators = await _validators("note", revision, updated_at, user_id, note_id)
+    if validators.not_modified(if_none_match, if_modified_since):
+        return validators.not_modified_response()
 
-    await NoteCRUD.delete(model_id=note_id)
+    async def load() -> bytes:
+        note, tags = await NoteCRUD.get_one(note_id, user_id)
+        if not note:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+        return encode_json(note_to_dict(note, tags))
 
+    return json_response(await _cached(validators, load), headers=validators.headers())
 
-async def archive_add_by_id(note_id: int, token: str):
-    payload = decode_access_token(token)
-    if payload is None:
-        raise HTTPException(status_code=401, detail="Не валидный токен")
 
-    user_id = payload.get("sub")
-    if not isinstance(user_id, str) or not user_id:
-        raise HTTPException(status_code=401, detail="Не валидный токен")
+async def _check_tags(tag_ids) -> dict[int, TagResponse]:
+    known_tags = await tag_registry.resolve(tag_ids)
+    if any(tag_id not in known_tags for tag_id in tag_ids):
+        raise HTTPException(status_code=422, detail="Неизвестный тег")
+    return known_tags
 
-    note = await NoteCRUD.find_by_id(model_id=note_id)
-    if note is None:
-        raise HTTPException(status_code=404, detail="Запись не найдена")
-    if note.user_id != int(user_id):
-        raise HTTPException(status_code=403, detail="Изменения не доступны")
 
-    await NoteCRUD.update(model_id=note_id, is_archive=True)
+async def create_note(data: NoteCreateRequest, user_id: int):
+    tag_ids = list(dict.fromkeys(data.noteTags))
+    await _check_tags(tag_ids)
 
+    # Заметка и все ее теги - одна транзакция и два запроса
+    async with session_scope() as session:
+        revision = await bump_revision(session, user_id)
+        note_id, = await NoteCRUD.insert_many(
+            session,
+            [{"user_id": user_id, "title": data.title, "description": data.description, "revision": revision}],
+        )
+        await NoteTagsCRUD.insert_links(session, [(note_id, tag_id) for tag_id in tag_ids])
 
-async def archive_remove_by_id(note_id: int, token: str):
-    payload = decode_access_token(token)
-    if payload is None:
-        raise HTTPException(status_code=401, detail="Не валидный токен")
+    return {"ok": True, "note_id": note_id}
 
-    user_id = payload.get("sub")
-    if not isinstance(user_id, str) or not user_id:
-        raise HTTPException(status_code=401, detail="Не валидный токен")
 
-    note = await NoteCRUD.find_by_id(model_id=note_id)
-    if note is None:
+async def _check_owner(session, note_id: int, user_id: int):
+    owners = await NoteCRUD.get_owners(session, [note_id])
+    if note_id not in owners:
         raise HTTPException(status_code=404, detail="Запись не найдена")
-    if note.user_id != int(user_id):
+    if owners[note_id] != user_id:
         raise HTTPException(status_code=403, detail="Изменения не доступны")
 
-    await NoteCRUD.update(model_id=note_id, is_archive=False)
-
-
-async def update_note(note_id: int, data: NoteUpdateRequest, token: str):
-    payload = decode_access_token(token)
-    if payload is None:
-        raise HTTPException(status_code=401, detail="Не валидный токен")
-
-    user_id = payload.get("sub")
-    if not isinstance(user_id, str) or not user_id:
-        raise HTTPException(status_code=401, detail="Не валидный токен")
-
-    note = await NoteCRUD.get_one(note_id)
-    if not note:
-        raise HTTPException(status_code=404, detail="Заметка не найдена")
-
-    if str(note.user_id) != user_id:
-        raise HTTPException(status_code=403, detail="Нет доступа к заметке")
-
-    # Обновляем основные поля заметки
-    note.title = data.title
-    note.description = data.description
-
-    # Обновляем теги
-    await NoteTagsCRUD.delete_many(note_id=note.id)
-    for tag_id in data.tags:
-        await NoteTagsCRUD.create(note_id=note.id, tag_id=tag_id)
-
-    await NoteCRUD.update(note_id, title=data.title, description=data.description)
-    return await get_by_id(note.id)
-
-
-async def export_to_excel(token: str):
-    # Получаем все заметки пользователя
-    notes = await get_all_my(token)
-
-    # Создаем новую книгу Excel
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Мои заметки"
-
-    # Добавляем заголовки
-    headers = ["ID", "Заголовок", "Описание", "Теги", "Дата создания", "Дата обновления"]
-    for col, header in enumerate(headers, 1):
-        ws.cell(row=1, column=col, value=header)
-
-    # Добавляем данные
-    for row, note in enumerate(notes, 2):
-        ws.cell(row=row, column=1, value=note.id)
-        ws.cell(row=row, column=2, value=note.title)
-        ws.cell(row=row, column=3, value=note.description)
-        ws.cell(row=row, column=4, value=", ".join(tag.name for tag in note.tags))
-        ws.cell(row=row, column=5, value=note.created_at.strftime("%Y-%m-%d %H:%M:%S"))
-        ws.cell(row=row, column=6, value=note.updated_at.strftime("%Y-%m-%d %H:%M:%S") if note.updated_at else "")
-
-    # Настраиваем ширину столбцов
-    for column in ws.columns:
-        max_length = 0
-        column = [cell for cell in column]
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[column[0].column_letter].width = adjusted_width
-
-    # Сохраняем в буфер
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
 
+async def delete_by_id(note_id: int, user_id: int):
+    async with session_scope() as session:
+        await _check_owner(session, note_id, user_id)
+        revision = await bump_revision(session, user_id)
+        await NoteCRUD.delete_many(session, [note_id])
+        await NoteTombstoneCRUD.insert_many(session, user_id, [note_id], revision)
+
+
+async def _set_archive(note_id: int, user_id: int, is_archive: bool):
+    async with session_scope() as session:
+        await _check_owner(session, note_id, user_id)
+        revision = await bump_revision(session, user_id)
+        await NoteCRUD.set_archive_many(session, [note_id], is_archive, revision)
+
+
+async def archive_add_by_id(note_id: int, user_id: int):
+    await _set_archive(note_id, user_id, True)
+
+
+async def archive_remove_by_id(note_id: int, user_id: int):
+    await _set_archive(note_id, user_id, False)
+
+
+async def update_note(note_id: int, data: NoteUpdateRequest, user_id: int):
+    tag_ids = list(dict.fromkeys(data.tags))
+    known_tags = await _check_tags(tag_ids)
+
+    async with session_scope() as session:
+        revision = await bump_revision(session, user_id)
+        note = await NoteCRUD.update_owned(
+            session, note_id, user_id, title=data.title, description=data.description, revision=revision
+        )
+        if note is None:
+            owners = await NoteCRUD.get_owners(session, [note_id])
+            if note_id not in owners:
+                raise HTTPException(status_code=404, detail="Заметка не найдена")
+            raise HTTPException(status_code=403, detail="Нет доступа к заметке")
+
+        await NoteTagsCRUD.replace_tags(session, note_id, tag_ids)
+
+    return _to_response(note, [known_tags[tag_id] for tag_id in tag_ids])
+
+
+async def apply_batch(user_id: int, data: NoteBatchRequest) -> NoteBatchResponse:
+    operations = data.operations
+    results: list[NoteBatchResult | None] = [None] * len(operations)
+    known_tags = await tag_registry.resolve(
+        {tag_id for op in operations if op.op in ("create", "update") for tag_id in op.tags}
+    )
+
+    async with session_scope() as session:
+        # Права на все затронутые заметки проверяются одним запросом
+        owners = await NoteCRUD.get_owners(session, {op.note_id for op in operations if op.op != "create"})
+
+        groups = {"create": [], "update": [], "archive": [], "unarchive": [], "delete": []}
+        seen = set()
+        for index, op in enumerate(operations):
+            note_id = getattr(op, "note_id", None)
+            detail = None
+            if op.op != "create":
+                if note_id not in owners:
+                    detail = "Заметка не найдена"
+                elif owners[note_id] != user_id:
+                    detail = "Нет доступа к заметке"
+                elif note_id in seen:
+                    detail = "Повторная операция с заметкой"
+                else:
+                    seen.add(note_id)
+            if detail is None and op.op in ("create", "update"):
+                if any(tag_id not in known_tags for tag_id in op.tags):
+                    detail = "Неизвестный тег"
+            if detail is not None:
+                results[index] = NoteBatchResult(index=index, op=op.op, ok=False, note_id=note_id, detail=detail)
+            else:
+                groups[op.op].append((index, op))
+
+        # Все изменения пакета - одна ревизия пользователя
+        revision = await bump_revision(session, user_id) if any(groups.values()) else None
+
+        created_ids = await NoteCRUD.insert_many(
+            session,
+            [
+                {"user_id": user_id, "title": op.title, "description": op.description, "revision": revision}
+                for _, op in groups["create"]
+            ],
+        )
+        links = []
+        for (index, op), note_id in zip(groups["create"], created_ids):
+            links.extend((note_id, tag_id) for tag_id in dict.fromkeys(op.tags))
+            results[index] = NoteBatchResult(index=index, op=op.op, ok=True, note_id=note_id)
+
+        await NoteCRUD.update_many(
+            session,
+            [{"id": op.note_id, "title": op.title, "description": op.description} for _, op in groups["update"]],
+            revision,
+        )
+        await NoteTagsCRUD.delete_for_notes(session, [op.note_id for _, op in groups["update"]])
+        for _, op in groups["update"]:
+            links.extend((op.note_id, tag_id) for tag_id in dict.fromkeys(op.tags))
+        await NoteTagsCRUD.insert_links(session, links)
+
+        await NoteCRUD.set_archive_many(session, [op.note_id for _, op in groups["archive"]], True, revision)
+        await NoteCRUD.set_archive_many(session, [op.note_id for _, op in groups["unarchive"]], False, revision)
+        deleted_ids = [op.note_id for _, op in groups["delete"]]
+        await NoteCRUD.delete_many(session, deleted_ids)
+        await NoteTombstoneCRUD.insert_many(session, user_id, deleted_ids, revision)
+
+        for name in ("update", "archive", "unarchive", "delete"):
+            for index, op in groups[name]:
+                results[index] = NoteBatchResult(index=index, op=op.op, ok=True, note_id=op.note_id)
+
+    return NoteBatchResponse(results=results)
+
+
+def _export_widths(rows: list[list]) -> list[int]:
+    """Ширины столбцов XLSX по первой порции строк, не шире EXPORT_MAX_COLUMN_WIDTH.
+
+    Точный максимум потребовал бы прочитать всю выгрузку до отправки первого байта.
+    """
+    widths = [len(header) for header in EXPORT_HEADERS]
+    for row_values in rows:
+        widths = [max(width, len(str(value))) for width, value in zip(widths, row_values)]
+    return [min(width, EXPORT_MAX_COLUMN_WIDTH) + 2 for width in widths]
+
+
+async def _excel_chunks(user_id: int):
+    async with async_session_maker() as session:
+        writer = None
+        async for rows in NoteCRUD.stream_export(session, user_id, settings.EXPORT_CHUNK_SIZE):
+            tags = await tag_registry.resolve({tag_id for row in rows for tag_id in row.tag_ids or ()})
+            cells = [
+                [
+                    row.id,
+                    row.title,
+                    row.description,
+                    ", ".join(tags[tag_id].name for tag_id in row.tag_ids or () if tag_id in tags),
+                    row.created_at.strftime(EXPORT_DATE_FORMAT),
+                    row.updated_at.strftime(EXPORT_DATE_FORMAT) if row.updated_at else "",
+                ]
+                for row in rows
+            ]
+            if writer is None:
+                writer = XlsxStreamWriter("Мои заметки", _export_widths(cells))
+                yield writer.start(EXPORT_HEADERS)
+            yield writer.write_rows(cells)
+        if writer is None:  # заметок нет - только заголовки
+            writer = XlsxStreamWriter("Мои заметки", _export_widths([]))
+            yield writer.start(EXPORT_HEADERS)
+        yield writer.finish()
+
+
+async def export_to_excel(user_id: int):
     # Формируем имя файла
     filename = f"notes_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
 
-    # Возвращаем файл для скачивания
+    # Книга пишется и отдается порциями, не собираясь целиком в памяти
     return StreamingResponse(
-        buffer,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        _excel_chunks(user_id),
+        media_type=XLSX_MEDIA_TYPE,
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
+
+
+async def _data_chunks(user_id: int, writer, since: datetime | None):
+    async with async_session_maker() as session:
+        yield writer.start()
+        async for rows in NoteCRUD.stream_export(session, user_id, settings.EXPORT_CHUNK_SIZE,
+                                                 include_archived=True, since=since):
+            tags = await tag_registry.resolve({tag_id for row in rows for tag_id in row.tag_ids or ()})
+            records = []
+            for row in rows:
+                tag_ids = [tag_id for tag_id in row.tag_ids or () if tag_id in tags]
+                records.append({
+                    "id": row.id,
+                    "title": row.title,
+                    "description": row.description,
+                    "is_archive": bool(row.is_archive),
+                    "tag_ids": tag_ids,
+                    "tags": [tags[tag_id].name for tag_id in tag_ids],
+                    "created_at": row.created_at,
+                    "updated_at": row.updated_at,
+                })
+            yield writer.write_rows(records)
+        yield writer.finish()
+
+
+async def export_data(user_id: int, fmt: str, since: datetime | None, accept_encoding: str | None):
+    if fmt not in DATA_WRITERS:
+        raise HTTPException(status_code=404, detail="Неизвестный формат выгрузки")
+    if not writer_available(fmt):
+        raise HTTPException(status_code=501, detail="Формат выгрузки не поддерживается сервером")
+
+    writer = DATA_WRITERS[fmt]()
+    filename = f"notes_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{writer.extension}"
+    headers = {"Content-Disposition": f"attachment; filename={filename}", "Vary": "Accept-Encoding"}
+
+    # Parquet уже сжат внутри файла, повторное сжатие только тратит CPU
+    encoder = choose_encoder(accept_encoding) if fmt != "parquet" else None
+    if encoder is not None:
+        headers["Content-Encoding"] = encoder.name
+
+    return StreamingResponse(
+        encode_stream(_data_chunks(user_id, writer, since), encoder),
+        media_type=writer.media_type,
+        headers=headers,
+    )
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import logging
+
+import asyncpg
+from sqlalchemy.engine import make_url
+
+from services.revision import NOTES_CHANNEL
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """Подписка одного клиента.
+
+    Хранит не очередь событий, а только последнюю ревизию: клиенту все равно нужно
+    дочитать изменения через /changes, поэтому промежуточные ревизии не нужны.
+    Медленный клиент не копит память, сколько бы событий ни пришло.
+    """
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.revision: int | None = None
+        self.resync = False
+        self._ready = asyncio.Event()
+
+    def push(self, revision: int):
+        if self.revision is None or revision > self.revision:
+            self.revision = revision
+        self._ready.set()
+
+    def request_resync(self):
+        self.resync = True
+        self._ready.set()
+
+    async def next(self, timeout: float) -> dict | None:
+        """Следующее событие или None, если за timeout ничего не пришло"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self._ready.clear()
+        if self.resync:
+            self.resync = False
+            self.revision = None
+            return {"event": "resync"}
+        revision, self.revision = self.revision, None
+        return {"event": "changes", "revision": revision}
+
+
+class ChangeBroker:
+    """Раздает события о ревизиях подписчикам этого воркера"""
+
+    def __init__(self):
+        self._subscriptions: dict[int, set[Subscription]] = {}
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = Subscription(user_id)
+        self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self._subscriptions.get(subscription.user_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.user_id]
+
+    def publish(self, user_id: int, revision: int):
+        for subscription in self._subscriptions.get(user_id, ()):
+            subscription.push(revision)
+
+    def resync_all(self):
+        for subscriptions in self._subscriptions.values():
+            for subscription in subscriptions:
+                subscription.request_resync()
+
+    @property
+    def subscribers(self) -> int:
+        return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+
+class NotesListener:
+    """Одно соединение LISTEN на воркер, независимое от пула SQLAlchemy.
+
+    Соединение периодически проверяется запросом; при обрыве слушатель переподключается
+    с экспоненциальной паузой, а подписчики получают resync, потому что события,
+    отправленные за время обрыва, потеряны.
+    """
+
+    def __init__(self, broker: ChangeBroker, dsn: str, check_interval: float, max_backoff: float):
+        self._broker = broker
+        self._dsn = dsn
+        self._check_interval = check_interval
+        self._max_backoff = max_backoff
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _on_notify(self, connection, pid, channel, payload):
+        try:
+            event = json.loads(payload)
+            self._broker.publish(int(event["user_id"]), int(event["revision"]))
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Некорректное событие в канале %s: %r", channel, payload)
+
+    async def _run(self):
+        backoff = 1.0
+        connected_before = False
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self._dsn, timeout=self._check_interval)
+                await connection.add_listener(NOTES_CHANNEL, self._on_notify)
+                backoff = 1.0
+                if connected_before:
+                    self._broker.resync_all()
+                connected_before = True
+                while True:
+                    await asyncio.sleep(self._check_interval)
+                    await connection.execute("SELECT 1", timeout=self._check_interval)
+            except (OSError, asyncio.TimeoutError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                logger.warning("Соединение LISTEN %s потеряно: %s; повтор через %.0f с", NOTES_CHANNEL, e, backoff)
+            except Exception:
+                # Любая другая ошибка не должна останавливать уведомления для всех пользователей
+                logger.exception("Сбой слушателя %s; повтор через %.0f с", NOTES_CHANNEL, backoff)
+            finally:
+                if connection is not None:
+                    connection.terminate()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self._max_backoff)
+
+
+def _listener_dsn() -> str:
+    # DB_URL в формате SQLAlchemy (postgresql+asyncpg://...), asyncpg нужен обычный postgresql://
+    return make_url(settings.DB_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+change_broker = ChangeBroker()
+notes_listener = NotesListener(
+    change_broker,
+    _listener_dsn(),
+    check_interval=settings.NOTES_STREAM_HEARTBEAT,
+    max_backoff=settings.NOTES_LISTENER_MAX_BACKOFF,
+)
+
+
+def _format_event(event: dict) -> str:
+    name = event.pop("event")
+    lines = [f"event: {name}"]
+    if "revision" in event:
+        lines.append(f"id: {event['revision']}")
+    lines.append(f"data: {json.dumps(event)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def stream_events(user_id: int, heartbeat: float):
+    """Поток Server-Sent Events для пользователя; heartbeat-комментарий, если событий нет.
+
+    Отключение клиента отменяет генератор, и подписка снимается в finally.
+    """
+    subscription = change_broker.subscribe(user_id)
+    try:
+        while True:
+            event = await subscription.next(heartbeat)
+            yield _format_event(event) if event is not None else ": ping\n\n"
+    finally:
+        change_broker.unsubscribe(subscription)
@@ -0,0 +1,62 @@
+import base64
+import json
+import math
+from datetime import datetime
+
+from fastapi import HTTPException
+
+
+def encode_cursor(*values) -> str:
+    """Упаковка значений ключа сортировки в непрозрачный курсор"""
+    raw = json.dumps(
+        [value.isoformat() if isinstance(value, datetime) else value for value in values],
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+# Преобразователи значений курсора для decode_cursor: значение вне диапазона столбца
+# дошло бы до базы и закончилось ошибкой 500, поэтому отсекается здесь
+def _integer(value, bits: int) -> int:
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise TypeError(value)
+    if not -2 ** (bits - 1) <= value < 2 ** (bits - 1):
+        raise ValueError(value)
+    return value
+
+
+def int32(value) -> int:
+    """Значение столбца Integer (id)"""
+    return _integer(value, 32)
+
+
+def int64(value) -> int:
+    """Значение столбца BigInteger (ревизия)"""
+    return _integer(value, 64)
+
+
+def finite_float(value) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise TypeError(value)
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError(value)
+    return value
+
+
+def timestamp(value) -> datetime:
+    return datetime.fromisoformat(value)
+
+
+def decode_cursor(cursor: str, *converters) -> tuple:
+    """Распаковка курсора, созданного encode_cursor; converters - по одному на значение"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+    if not isinstance(values, list) or len(values) != len(converters):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+    try:
+        return tuple(convert(value) for convert, value in zip(converters, values))
+    except (TypeError, ValueError, OverflowError):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
@@ -0,0 +1,94 @@
+from datetime import datetime
+
+from sqlalchemy import select, update, insert, func, cast, Text
+
+from database.base_crud import BaseCRUD, any_of
+from database.database import session_scope
+from models.notes import Note, NoteTombstone
+from models.users import User
+
+# Канал Postgres, в который уходят события о новых ревизиях заметок
+NOTES_CHANNEL = "notes_changes"
+
+
+class NoteTombstoneCRUD(BaseCRUD):
+    model = NoteTombstone
+
+    @classmethod
+    async def insert_many(cls, session, user_id: int, note_ids, revision: int):
+        if not note_ids:
+            return
+        await session.execute(
+            insert(cls.model),
+            [{"user_id": user_id, "note_id": note_id, "revision": revision} for note_id in note_ids],
+        )
+
+    @classmethod
+    async def insert_for_users(cls, session, deleted: list[tuple[int, int]], revisions: dict[int, int]):
+        """Следы удаления заметок разных пользователей: пары (note_id, user_id)"""
+        if not deleted:
+            return
+        await session.execute(
+            insert(cls.model),
+            [{"user_id": user_id, "note_id": note_id, "revision": revisions[user_id]} for note_id, user_id in deleted],
+        )
+
+
+def _bump_users(condition):
+    """UPDATE счетчиков пользователей и NOTIFY о новой ревизии одним запросом.
+
+    NOTIFY транзакционный: слушатели получат событие только после коммита,
+    а при откате его не будет вовсе.
+    """
+    bumped = (
+        update(User)
+        .where(condition)
+        # updated_at задан явно, иначе сработал бы onupdate: изменение заметок - не правка профиля
+        .values(notes_revision=User.notes_revision + 1, notes_changed_at=func.now(), updated_at=User.updated_at)
+        .returning(User.id, User.notes_revision)
+        .cte("bumped")
+    )
+    event = func.json_build_object("user_id", bumped.c.id, "revision", bumped.c.notes_revision)
+    return select(bumped.c.id, bumped.c.notes_revision, func.pg_notify(NOTES_CHANNEL, cast(event, Text)))
+
+
+async def bump_revision(session, user_id: int) -> int:
+    """Следующая ревизия заметок пользователя; все изменения транзакции получают одну ревизию.
+
+    UPDATE держит блокировку строки пользователя до конца транзакции, поэтому
+    параллельная запись того же пользователя получит большую ревизию только после
+    коммита этой. Клиент, дочитавший изменения до ревизии N, не пропустит ревизию
+    меньше N, закоммиченную позже.
+    """
+    _, revision, _ = (await session.execute(_bump_users(User.id == user_id))).one()
+    return revision
+
+
+async def bump_revisions(session, user_ids) -> dict[int, int]:
+    """Следующие ревизии сразу для многих пользователей, одним запросом: user_id -> ревизия"""
+    if not user_ids:
+        return {}
+    rows = (await session.execute(_bump_users(any_of(User.id, user_ids)))).all()
+    return {user_id: revision for user_id, revision, _ in rows}
+
+
+async def get_revision(user_id: int) -> tuple[int, datetime] | None:
+    """Ревизия заметок пользователя и время ее создания - один запрос по первичному ключу"""
+    async with session_scope() as session:
+        query = select(User.notes_revision, User.notes_changed_at).where(User.id == user_id)
+        return (await session.execute(query)).one_or_none()
+
+
+async def touch_notes(session, note_ids):
+    """Новая ревизия для заметок разных пользователей (например, при удалении тега)"""
+    if not note_ids:
+        return
+    owners = select(Note.user_id).where(any_of(Note.id, note_ids))
+    await session.execute(_bump_users(User.id.in_(owners)))
+    # Счетчики уже увеличены в этой транзакции - заметки берут их новые значения
+    await session.execute(
+        update(Note)
+        .where(Note.user_id == User.id, any_of(Note.id, note_ids))
+        .values(revision=User.notes_revision)
+        .execution_options(synchronize_session=False)
+    )
@@ -0,0 +1,54 @@
+import orjson
+from fastapi import Response
+
+# OPT_UTC_Z пишет UTC как "Z", так же как pydantic, - формат дат в ответах не меняется
+JSON_OPTIONS = orjson.OPT_UTC_Z
+
+
+def note_to_dict(row, tags: list[dict]) -> dict:
+    """Строка заметки в словарь с полями NoteResponse в том же порядке.
+
+    Данные из базы уже нужных типов, поэтому валидация pydantic пропускается.
+    """
+    return {
+        "id": row.id,
+        "title": row.title,
+        "user_id": row.user_id,
+        "description": row.description,
+        "is_archive": row.is_archive,
+        "created_at": row.created_at,
+        "updated_at": row.updated_at,
+        "tags": tags,
+    }
+
+
+def note_summary_to_dict(row, tags: list[dict]) -> dict:
+    """Строка заметки в словарь с полями NoteSummaryResponse"""
+    return {
+        "id": row.id,
+        "title": row.title,
+        "user_id": row.user_id,
+        "description_preview": row.description_preview,
+        "description_length": row.description_length,
+        "is_archive": row.is_archive,
+        "created_at": row.created_at,
+        "updated_at": row.updated_at,
+        "tags": tags,
+    }
+
+
+def encode_json(payload) -> bytes:
+    return orjson.dumps(payload, option=JSON_OPTIONS)
+
+
+def json_response(payload, status_code: int = 200, headers: dict | None = None) -> Response:
+    """Готовый JSON-ответ: FastAPI отдает Response как есть, без повторной валидации response_model.
+
+    payload - данные для кодирования или уже закодированное тело (bytes).
+    """
+    return Response(
+        payload if isinstance(payload, bytes) else encode_json(payload),
+        status_code=status_code,
+        media_type="application/json",
+        headers=headers,
+    )
@@ -0,0 +1,59 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Объединение одинаковых одновременных вызовов.
+
+    Пока выполняется вызов с ключом key, остальные вызовы с тем же ключом ждут его
+    результат (или ошибку), а не запускают свой. Закончившийся вызов сразу забывается,
+    поэтому результаты не кэшируются: вызов, пришедший после завершения, выполнится заново.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: dict[Hashable, asyncio.Future] = {}
+        self.executed = 0
+        self.coalesced = 0
+        flights.append(self)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(call)
+            except asyncio.CancelledError:
+                # Отменили выполнявший вызов, а не этот - выполняем заново
+                if call.cancelled() and not asyncio.current_task().cancelling():
+                    return await self.do(key, fn)
+                raise
+
+        call = asyncio.get_running_loop().create_future()
+        self._calls[key] = call
+        self.executed += 1
+        try:
+            result = await fn()
+        except Exception as e:
+            call.set_exception(e)
+            # Ошибку уже получил этот вызов; ожидающих может не быть
+            call.exception()
+            raise
+        except asyncio.CancelledError:
+            call.cancel()
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+
+# Все экземпляры - для метрик
+flights: list[SingleFlight] = []
@@ -1,59 +1,333 @@
-from fastapi import HTTPException
+import csv
+import hashlib
+import io
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from fastapi import HTTPException, Response
+from fastapi.exceptions import RequestValidationError
+from pydantic import TypeAdapter, ValidationError
 from database.base_crud import BaseCRUD
-from database.database import async_session_maker
-from dto.tag_dto import TagRequest, TagDB
+from database.database import async_session_maker, session_scope, after_commit
+from dto.note_dto import TagResponse
+from dto.tag_dto import TagRequest, TagDB, TagImportResponse
 from models.notes import Tag, Note, NotesTags
-from security import decode_access_token
-from services.user import UserCRUD
-from sqlalchemy import select
+from services.http_cache import etag_matches
+from services.revision import touch_notes, bump_revisions, NoteTombstoneCRUD
+from services.singleflight import SingleFlight
+from settings import settings
+from sqlalchemy import select, delete, func, distinct, case, literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+
+# Стартовый набор тегов для /tags/generate/
+DEFAULT_TAGS = [
+    ("В процессе", "#FFA500"),
+    ("Личное", "#FF6347"),
+    ("Работа", "#4682B4"),
+    ("Семья", "#FFD700"),
+    ("Друзья", "#32CD32"),
+    ("Завершено", "#8A2BE2"),
+    ("Идеи", "#FF69B4"),
+    ("Важно", "#00BFFF"),
+    ("Курсы", "#FF4500"),
+    ("Проекты", "#2E8B57"),
+    ("Задачи", "#B8860B"),
+    ("Наброски", "#6A5ACD"),
+    ("Напоминания", "#DC143C"),
+    ("На заметку", "#FFDAB9"),
+    ("Читать", "#00CED1"),
+    ("Смотреть", "#FF8C00"),
+    ("Покупки", "#ADFF2F"),
+    ("Поездки", "#C71585"),
+    ("Здоровье", "#8B0000"),
+    ("Финансы", "#FFA07A"),
+    ("Хобби", "#4682B4"),
+]
+
+_TAG_LIST = TypeAdapter(list[TagRequest])
 
 
 class TagCRUD(BaseCRUD):
     model = Tag
 
+    @classmethod
+    async def upsert_many(cls, session, tags: dict[str, str], update_existing: bool = True):
+        """Теги одним многострочным INSERT ... ON CONFLICT (name) DO UPDATE.
 
-async def get_all() -> list[TagDB]:
-    tags = await TagCRUD.find_all()
-    return tags
+        Имена должны быть уникальны: иначе Postgres откажется обновлять одну строку дважды.
+        updated_at меняется только при смене цвета, так что повторный импорт ничего не меняет.
+        С update_existing=False существующие теги не трогаются (DO NOTHING) и не возвращаются.
+        """
+        query = pg_insert(cls.model).values([{"name": name, "color": color} for name, color in tags.items()])
+        if update_existing:
+            query = query.on_conflict_do_update(
+                index_elements=["name"],
+                set_={
+                    "color": query.excluded.color,
+                    "updated_at": case(
+                        (cls.model.color.is_distinct_from(query.excluded.color), func.now()),
+                        else_=cls.model.updated_at,
+                    ),
+                },
+            )
+        else:
+            query = query.on_conflict_do_nothing(index_elements=["name"])
+        query = query.returning(
+            cls.model.id, cls.model.name, cls.model.color, cls.model.created_at, cls.model.updated_at,
+            # xmax = 0 только у только что вставленных строк
+            literal_column("xmax = 0").label("created"),
+            (cls.model.updated_at == func.now()).label("touched"),
+        )
+        return (await session.execute(query)).all()
 
+    # Удаление тега порциями; каждая порция - в переданной сессии, коммит делает вызывающий код
+    @classmethod
+    async def get_usage(cls, session, tag_id: int) -> tuple[int, int]:
+        """Сколько заметок и у скольких пользователей помечено тегом"""
+        query = (
+            select(func.count(), func.count(distinct(Note.user_id)))
+            .select_from(NotesTags)
+            .join(Note, Note.id == NotesTags.note_id)
+            .where(NotesTags.tag_id == tag_id)
+        )
+        return tuple((await session.execute(query)).one())
 
-async def remove_tag(id_tag: int, token: str):
-    if token:
-        payload = decode_access_token(token)
-        if payload is None:
-            raise HTTPException(status_code=401, detail="Не валидный токен")
-        user_id = payload.get("sub")
-        if not isinstance(user_id, str) or not user_id:
-            raise HTTPException(status_code=401, detail="Не валидный токен")
-        user = await UserCRUD.find_one_or_none(id=int(user_id))
-        if not user.is_admin:
-            raise HTTPException(status_code=403, detail="Нет доступа")
-        async with async_session_maker() as session:
-            notes_associated = await session.execute(
-                select(Note).join(NotesTags).filter(NotesTags.tag_id == id_tag)
+    @classmethod
+    def _linked_notes(cls, tag_id: int, limit: int | None):
+        query = select(NotesTags.note_id).where(NotesTags.tag_id == tag_id)
+        return query.limit(limit) if limit is not None else query
+
+    @classmethod
+    async def detach_batch(cls, session, tag_id: int, limit: int | None) -> int:
+        """Снимает тег не более чем с limit заметок, заметки получают новую ревизию"""
+        query = (
+            delete(NotesTags)
+            .where(NotesTags.tag_id == tag_id, NotesTags.note_id.in_(cls._linked_notes(tag_id, limit)))
+            .returning(NotesTags.note_id)
+            .execution_options(synchronize_session=False)
+        )
+        note_ids = (await session.execute(query)).scalars().all()
+        await touch_notes(session, note_ids)
+        return len(note_ids)
+
+    @classmethod
+    async def delete_notes_batch(cls, session, tag_id: int, limit: int | None) -> int:
+        """Удаляет не более limit заметок с тегом; их владельцы получают ревизию и следы удаления"""
+        query = (
+            delete(Note)
+            .where(Note.id.in_(cls._linked_notes(tag_id, limit)))
+            .returning(Note.id, Note.user_id)
+            .execution_options(synchronize_session=False)
+        )
+        deleted = (await session.execute(query)).all()
+        revisions = await bump_revisions(session, {user_id for _, user_id in deleted})
+        await NoteTombstoneCRUD.insert_for_users(session, deleted, revisions)
+        return len(deleted)
+
+
+@dataclass(frozen=True)
+class TagCatalogue:
+    """Неизменяемый снимок справочника тегов"""
+    version: int
+    etag: str
+    tags: list[TagDB]
+    by_id: dict[int, TagResponse] = field(repr=False)
+    # Те же теги простыми словарями - для сериализации ответов без pydantic
+    dicts: dict[int, dict] = field(repr=False)
+    # Последнее изменение тегов; входит в Last-Modified ответов с заметками
+    last_modified: datetime | None = None
+
+
+class TagRegistry:
+    """Справочник тегов в памяти процесса.
+
+    Загружается при старте приложения, перечитывается после invalidate() и по истечении
+    TAG_CACHE_TTL (так изменения, сделанные другим воркером, доходят до этого процесса).
+    ETag считается по содержимому, поэтому совпадает во всех воркерах.
+
+    Одновременные перечитывания объединяются. invalidate() начинает новое поколение:
+    загрузка, начатая до него, не считается свежей, и к ней не присоединяются.
+
+    Неизвестный id тега приходит от клиента, поэтому внеочередное перечитывание из-за
+    него делается не чаще раза в forced_reload_interval секунд.
+    """
+
+    def __init__(self, ttl: float, forced_reload_interval: float = 0.0):
+        self._ttl = ttl
+        self._forced_reload_interval = forced_reload_interval
+        self._forced_at = float("-inf")
+        self._catalogue: TagCatalogue | None = None
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._flight = SingleFlight("tag_registry")
+
+    async def load(self) -> TagCatalogue:
+        generation = self._generation
+        tags = [
+            TagDB(id=tag.id, name=tag.name, color=tag.color, created_at=tag.created_at, updated_at=tag.updated_at)
+            for tag in sorted(await TagCRUD.find_all(), key=lambda tag: tag.id)
+        ]
+        digest = hashlib.sha256()
+        for tag in tags:
+            digest.update(f"{tag.id}\x1f{tag.name}\x1f{tag.color}\x1f{tag.updated_at.isoformat()}\x1e".encode())
+        etag = f'"tags-{digest.hexdigest()[:32]}"'
+
+        previous = self._catalogue
+        if previous is not None and previous.etag == etag:
+            catalogue = previous
+        else:
+            catalogue = TagCatalogue(
+                version=previous.version + 1 if previous else 1,
+                etag=etag,
+                tags=tags,
+                by_id={tag.id: TagResponse(id=tag.id, name=tag.name, color=tag.color) for tag in tags},
+                dicts={tag.id: {"id": tag.id, "name": tag.name, "color": tag.color} for tag in tags},
+                last_modified=max((tag.updated_at for tag in tags), default=None),
             )
-            notes_to_delete = notes_associated.scalars().all()
-
-            for note in notes_to_delete:
-                await session.delete(note)
-
-            await TagCRUD.delete(model_id=id_tag)
-        return {"ok": True}
-    else:
-        return {"ok": False}
-
-
-async def create_tag(data: TagRequest, token: str):
-    if token:
-        payload = decode_access_token(token)
-        if payload is None:
-            raise HTTPException(status_code=401, detail="Не валидный токен")
-        user_id = payload.get("sub")
-        if not isinstance(user_id, str) or not user_id:
-            raise HTTPException(status_code=401, detail="Не валидный токен")
-        user = await UserCRUD.find_one_or_none(id=int(user_id))
-        if not user.is_admin:
-            raise HTTPException(status_code=403, detail="Нет доступа")
-    tag_id = await TagCRUD.create_and_return_id(name=data.name, color=data.color)
+        self._catalogue = catalogue
+        self._loaded_at = time.monotonic() if generation == self._generation else 0.0
+        return catalogue
+
+    def invalidate(self):
+        self._generation += 1
+        self._loaded_at = 0.0
+
+    async def get(self) -> TagCatalogue:
+        catalogue = self._catalogue
+        if catalogue is not None and time.monotonic() - self._loaded_at < self._ttl:
+            return catalogue
+        return await self._flight.do(self._generation, self.load)
+
+    async def _resolve_catalogue(self, tag_ids) -> TagCatalogue:
+        """Неизвестный id может означать, что тег создан в другом воркере, - перечитываем.
+
+        Id, неизвестные и после этого, остаются за вызывающим кодом (отказ 422).
+        """
+        catalogue = await self.get()
+        if any(tag_id not in catalogue.by_id for tag_id in tag_ids):
+            now = time.monotonic()
+            if now - self._forced_at >= self._forced_reload_interval:
+                self._forced_at = now
+                self.invalidate()
+            catalogue = await self.get()
+        return catalogue
+
+    async def resolve(self, tag_ids) -> dict[int, TagResponse]:
+        return (await self._resolve_catalogue(tag_ids)).by_id
+
+    async def resolve_dicts(self, tag_ids) -> dict[int, dict]:
+        return (await self._resolve_catalogue(tag_ids)).dicts
+
+
+tag_registry = TagRegistry(ttl=settings.TAG_CACHE_TTL, forced_reload_interval=settings.TAG_FORCED_RELOAD_INTERVAL)
+
+
+async def get_all(response: Response, if_none_match: str | None = None):
+    catalogue = await tag_registry.get()
+    if etag_matches(if_none_match, catalogue.etag):
+        return Response(status_code=304, headers={"ETag": catalogue.etag, "Cache-Control": "no-cache"})
+    response.headers["ETag"] = catalogue.etag
+    response.headers["Cache-Control"] = "no-cache"
+    return catalogue.tags
+
+
+async def remove_tag(id_tag: int, mode: str = "detach", dry_run: bool = False):
+    """Удаление тега: detach снимает тег с заметок, delete_notes удаляет помеченные заметки.
+
+    Заметки обрабатываются порциями по TAG_DELETE_BATCH_SIZE, каждая - в своей короткой
+    транзакции, чтобы не держать блокировки на все заметки популярного тега. Последняя
+    транзакция добирает связи, появившиеся за время удаления, и удаляет сам тег.
+    """
+    if await TagCRUD.find_by_id(model_id=id_tag) is None:
+        raise HTTPException(status_code=404, detail="Тег не найден")
+
+    if dry_run:
+        async with async_session_maker() as session:
+            notes, users = await TagCRUD.get_usage(session, id_tag)
+        return {"ok": True, "dry_run": True, "mode": mode, "notes": notes, "users": users}
+
+    step = TagCRUD.delete_notes_batch if mode == "delete_notes" else TagCRUD.detach_batch
+    batch_size = settings.TAG_DELETE_BATCH_SIZE
+    notes = batches = 0
+    while True:
+        async with async_session_maker() as session:
+            processed = await step(session, id_tag, batch_size)
+            await session.commit()
+        notes += processed
+        batches += 1
+        if processed < batch_size:
+            break
+
+    async with async_session_maker() as session:
+        notes += await step(session, id_tag, None)
+        await session.execute(delete(Tag).where(Tag.id == id_tag))
+        await session.commit()
+    tag_registry.invalidate()
+    return {"ok": True, "dry_run": False, "mode": mode, "notes": notes, "batches": batches}
+
+
+def parse_import(body: bytes, content_type: str | None) -> list[TagRequest]:
+    """Теги из тела запроса: JSON-массив [{"name", "color"}] или CSV name,color (заголовок необязателен)"""
+    media_type = (content_type or "").partition(";")[0].strip().lower()
+    if media_type != "text/csv":
+        try:
+            return _TAG_LIST.validate_json(body)
+        except ValidationError as e:
+            raise RequestValidationError(e.errors())
+
+    try:
+        text = body.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="CSV должен быть в кодировке UTF-8")
+    tags = []
+    for line, row in enumerate(csv.reader(io.StringIO(text)), 1):
+        if not any(field.strip() for field in row):
+            continue
+        if line == 1 and [field.strip().lower() for field in row] == ["name", "color"]:
+            continue
+        if len(row) != 2:
+            raise HTTPException(status_code=400, detail=f"Некорректная строка CSV: {line}")
+        tags.append(TagRequest(name=row[0], color=row[1]))
+    return tags
+
+
+async def import_tags(tags: list[TagRequest], update_existing: bool = True) -> TagImportResponse:
+    """Создание и обновление тегов по имени одним запросом; при повторе имени побеждает последний цвет.
+
+    update_existing=False только добавляет недостающие теги, цвета существующих не меняются.
+    """
+    unique = {}
+    for tag in tags:
+        name = tag.name.strip()
+        if not name:
+            raise HTTPException(status_code=400, detail="Пустое имя тега")
+        unique[name] = tag.color.strip()
+    if not unique:
+        raise HTTPException(status_code=400, detail="Нет тегов для импорта")
+    if len(unique) > settings.TAG_IMPORT_MAX_ROWS:
+        raise HTTPException(status_code=400, detail="Слишком много тегов в одном импорте")
+
+    async with session_scope() as session:
+        rows = await TagCRUD.upsert_many(session, unique, update_existing)
+    after_commit(tag_registry.invalidate)
+    return TagImportResponse(
+        created=sum(row.created for row in rows),
+        updated=sum(row.touched and not row.created for row in rows),
+        tags=[
+            TagDB(id=row.id, name=row.name, color=row.color, created_at=row.created_at, updated_at=row.updated_at)
+            for row in rows
+        ],
+    )
+
+
+async def create_tag(data: TagRequest):
+    try:
+        tag_id = await TagCRUD.create_and_return_id(name=data.name, color=data.color)
+    except IntegrityError:
+        # uq_tags_name; проверка заранее не спасла бы от одновременного создания
+        raise HTTPException(status_code=409, detail="Тег с таким именем уже существует")
+    after_commit(tag_registry.invalidate)
     new_tag = await TagCRUD.find_one_or_none(id=tag_id)
     return new_tag
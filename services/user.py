@@ -1,14 +1,11 @@
-from typing import Annotated
-
-from fastapi import HTTPException, status, Depends
-from fastapi.security import OAuth2PasswordBearer
+from fastapi import HTTPException, status
 
 from dto.user_dto import UserRegisterRequest, UserLoginRequest
 from models.users import User
 from database.base_crud import BaseCRUD
-from security import hash_password, create_perpetual_token, verify_password, decode_access_token
-
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+from security import (
+    create_perpetual_token, hash_password_async, verify_password_async, PasswordHashPoolBusy
+)
 
 class UserCRUD(BaseCRUD):
     model = User
@@ -21,7 +18,10 @@ async def get_all():
 async def register(data: UserRegisterRequest):
     if await UserCRUD.find_one_or_none(email=data.email):
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Email уже используется')
-    hashed_password = hash_password(data.password)
+    try:
+        hashed_password = await hash_password_async(data.password)
+    except PasswordHashPoolBusy:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Сервис перегружен")
     user_id = await UserCRUD.create_and_return_id(name=data.name, last_name=data.last_name, email=data.email,
                                                   password_hash=hashed_password)
     token = create_perpetual_token({"sub": str(user_id)})
@@ -30,22 +30,23 @@ async def register(data: UserRegisterRequest):
 
 async def login(data: UserLoginRequest):
     user = await UserCRUD.find_one_or_none(email=data.email)
-    if user is None or not verify_password(data.password, user.password_hash):
+    if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Неверные учетные данные")
+    try:
+        is_valid, new_hash = await verify_password_async(data.password, user.password_hash)
+    except PasswordHashPoolBusy:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Сервис перегружен")
+    if not is_valid:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Неверные учетные данные")
+    if new_hash is not None:
+        # Параметры argon2 изменились - сохраняем хэш, посчитанный с новыми
+        await UserCRUD.update(user.id, password_hash=new_hash)
     token = create_perpetual_token({"sub": str(user.id)})
     return {"token": token}
 
 
-async def get_profile(token: Annotated[str, Depends(oauth2_scheme)]):
-    payload = decode_access_token(token)
-    if payload is None:
-        raise HTTPException(status_code=401, detail="Не валидный токен")
-
-    user_id = payload.get("sub")
-    if not isinstance(user_id, str) or not user_id:
-        raise HTTPException(status_code=401, detail="Не валидный токен")
-
-    user = await UserCRUD.find_one_or_none(id=int(user_id))
+async def get_profile(user_id: int):
+    user = await UserCRUD.find_one_or_none(id=user_id)
     if user is None:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
 
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -7,6 +9,59 @@ class Settings(BaseSettings):
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str
 
+    # Пул соединений с базой. DB_ECHO: false, true (SQL в лог) или "debug" (еще и строки результатов)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_WARMUP: int = 0
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    DB_ECHO: bool | Literal["debug"] = False
+
+    # Сколько секунд справочник тегов живет в памяти процесса без перечитывания
+    TAG_CACHE_TTL: float = 60
+    # Внеочередное перечитывание из-за неизвестного id тега - не чаще раза в столько секунд
+    TAG_FORCED_RELOAD_INTERVAL: float = 5
+
+    # Кэш проверенных токенов: сколько записей держать и сколько секунд доверять is_admin
+    AUTH_CACHE_MAX_SIZE: int = 10000
+    AUTH_CACHE_TTL: float = 300
+
+    # Параметры argon2; после их изменения хэши пересчитываются при входе пользователя
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST: int = 65536
+    ARGON2_PARALLELISM: int = 4
+    # Пул для хэширования паролей: вид исполнителя, число одновременных вычислений
+    # и сколько запросов может ждать своей очереди, прежде чем получить 503
+    PASSWORD_HASH_EXECUTOR: Literal["thread", "process"] = "thread"
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_QUEUE: int = 64
+
+    # Сколько строк за раз читается из серверного курсора при выгрузке заметок
+    EXPORT_CHUNK_SIZE: int = 1000
+
+    # Push-уведомления об изменениях заметок: как часто слать heartbeat клиентам и проверять
+    # соединение LISTEN, и максимальная пауза между попытками переподключиться к базе
+    NOTES_STREAM_HEARTBEAT: float = 15
+    NOTES_LISTENER_MAX_BACKOFF: float = 30
+    # Сколько секунд действует билет для подключения EventSource к /notes/stream
+    NOTES_STREAM_TICKET_TTL: int = 60
+
+    # Сколько связей или заметок удаляется за одну короткую транзакцию при удалении тега
+    TAG_DELETE_BATCH_SIZE: int = 1000
+    # Импорт тегов одним INSERT: по два параметра на тег, предел asyncpg - 32767 параметров
+    TAG_IMPORT_MAX_ROWS: int = 5000
+
+    # Кэш ответов со списками заметок: общий уровень (redis://...; пусто - только память процесса),
+    # предел памяти процесса под кэш в байтах и время жизни записей в секундах
+    CACHE_BACKEND_URL: str | None = None
+    CACHE_LOCAL_MAX_BYTES: int = 64 * 1024 * 1024
+    CACHE_TTL: float = 300
+
+    # Токен для сбора /metrics (Authorization: Bearer ...); без него метрики видит только администратор
+    METRICS_TOKEN: str | None = None
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -0,0 +1,116 @@
+import asyncio
+import gzip
+import io
+import zipfile
+from datetime import datetime, timezone
+from xml.etree import ElementTree
+
+import pytest
+
+pytest.importorskip("orjson")
+
+from services import export
+from services.export import (
+    CsvStreamWriter, XlsxStreamWriter, choose_encoder, encode_stream, writer_available,
+)
+
+SHEET_NS = {"s": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+
+
+def _cells(sheet: bytes) -> list[list[str]]:
+    root = ElementTree.fromstring(sheet)
+    return [
+        ["".join(cell.itertext()) for cell in row.findall("s:c", SHEET_NS)]
+        for row in root.find("s:sheetData", SHEET_NS).findall("s:row", SHEET_NS)
+    ]
+
+
+def test_xlsx_is_a_valid_workbook():
+    writer = XlsxStreamWriter("Мои <заметки> & \"черновики\"", [10, 20, 30])
+    chunks = [writer.start(["ID", "Заголовок", "Описание"])]
+    chunks.append(writer.write_rows([
+        [1, "Привет, мир", "<b>жирный</b> & \"кавычки\" 'апостроф'"],
+        [2, "Эмодзи 📝", "управляющие\x01символы\x0bудаляются"],
+    ]))
+    chunks.append(writer.write_rows([[3, None, "x" * (export.XLSX_MAX_CELL_LENGTH + 10)]]))
+    chunks.append(writer.finish())
+
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as workbook:
+        assert workbook.testzip() is None
+        assert {"[Content_Types].xml", "xl/workbook.xml", "xl/worksheets/sheet1.xml"} <= set(workbook.namelist())
+        ElementTree.fromstring(workbook.read("xl/workbook.xml"))
+        rows = _cells(workbook.read("xl/worksheets/sheet1.xml"))
+
+    assert rows[0] == ["ID", "Заголовок", "Описание"]
+    assert rows[1] == ["1", "Привет, мир", "<b>жирный</b> & \"кавычки\" 'апостроф'"]
+    assert rows[2] == ["2", "Эмодзи 📝", "управляющиесимволыудаляются"]
+    # Пустая ячейка пропускается, длинный текст обрезается до предела Excel
+    assert rows[3] == ["3", "x" * export.XLSX_MAX_CELL_LENGTH]
+
+
+def test_xlsx_chunks_are_never_rewritten():
+    writer = XlsxStreamWriter("Лист", [5])
+    first = writer.start(["A"])
+    rows = writer.write_rows([[i] for i in range(1000)])
+    tail = writer.finish()
+    # Приемник без seek: каждая порция - продолжение уже отданных байтов
+    assert first.startswith(b"PK")
+    assert zipfile.is_zipfile(io.BytesIO(first + rows + tail))
+
+
+def test_csv_quotes_special_characters():
+    writer = CsvStreamWriter()
+    record = {
+        "id": 1, "title": "a,b", "description": "строка\n\"цитата\"", "is_archive": False,
+        "tag_ids": [1, 2], "tags": ["Работа", "Идеи"],
+        "created_at": datetime(2024, 1, 1, tzinfo=timezone.utc),
+        "updated_at": datetime(2024, 1, 2, tzinfo=timezone.utc),
+    }
+    body = (writer.start() + writer.write_rows([record]) + writer.finish()).decode()
+    assert body.splitlines()[0] == ",".join(export.EXPORT_FIELDS)
+    assert '"a,b","строка\n""цитата""",False,1;2,Работа;Идеи' in body
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("GZIP;q=0.5", "gzip"),
+    ("gzip;q=0", None),
+    ("br, *", "gzip"),
+])
+def test_choose_encoder_without_zstd(monkeypatch, header, expected):
+    monkeypatch.setattr(export, "zstandard", None)
+    encoder = choose_encoder(header)
+    assert (encoder.name if encoder else None) == expected
+
+
+def test_zstd_preferred_when_installed():
+    pytest.importorskip("zstandard")
+    assert choose_encoder("gzip, zstd").name == "zstd"
+    assert choose_encoder("gzip, zstd;q=0").name == "gzip"
+
+
+def test_zstd_falls_back_to_gzip_when_missing(monkeypatch):
+    monkeypatch.setattr(export, "zstandard", None)
+    assert choose_encoder("zstd, gzip").name == "gzip"
+    assert choose_encoder("zstd") is None
+
+
+def test_parquet_unavailable_without_pyarrow(monkeypatch):
+    monkeypatch.setattr(export, "pyarrow", None)
+    assert not writer_available("parquet")
+    assert writer_available("csv") and writer_available("ndjson")
+
+
+def test_encode_stream_gzip_roundtrip():
+    async def chunks():
+        for part in (b"first,", b"", "второй".encode()):
+            yield part
+
+    async def collect(encoder):
+        return b"".join([chunk async for chunk in encode_stream(chunks(), encoder)])
+
+    assert gzip.decompress(asyncio.run(collect(choose_encoder("gzip")))) == "first,второй".encode()
+    assert asyncio.run(collect(None)) == "first,второй".encode()
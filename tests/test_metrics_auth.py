@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("argon2")
+pytest.importorskip("jose")
+pytest.importorskip("sqlalchemy")
+
+from fastapi import HTTPException
+
+from security import Principal, token_cache
+from services import auth
+
+
+@pytest.fixture
+def cached_tokens():
+    token_cache.set("admin-token", Principal(id=1, is_admin=True))
+    token_cache.set("user-token", Principal(id=2, is_admin=False))
+    yield
+    token_cache.evict_user(1)
+    token_cache.evict_user(2)
+
+
+def test_metrics_token_is_accepted(monkeypatch):
+    monkeypatch.setattr(auth.settings, "METRICS_TOKEN", "scrape-secret")
+    asyncio.run(auth.get_metrics_reader("scrape-secret"))
+
+
+def test_admin_token_is_accepted(monkeypatch, cached_tokens):
+    monkeypatch.setattr(auth.settings, "METRICS_TOKEN", None)
+    asyncio.run(auth.get_metrics_reader("admin-token"))
+
+
+@pytest.mark.parametrize("token, status_code", [(None, 401), ("user-token", 403)])
+def test_metrics_require_token(monkeypatch, cached_tokens, token, status_code):
+    monkeypatch.setattr(auth.settings, "METRICS_TOKEN", "scrape-secret")
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(auth.get_metrics_reader(token))
+    assert error.value.status_code == status_code
@@ -0,0 +1,34 @@
+import pytest
+
+pytest.importorskip("pydantic")
+
+from pydantic import ValidationError
+
+from dto.note_dto import NoteBatchRequest, NoteCreateRequest, NoteUpdateRequest
+
+
+def test_batch_accepts_int32_ids():
+    request = NoteBatchRequest(operations=[
+        {"op": "create", "title": "t", "tags": [1, 2 ** 31 - 1]},
+        {"op": "update", "note_id": 2 ** 31 - 1, "title": "t", "description": "d", "tags": [5]},
+        {"op": "delete", "note_id": 1},
+    ])
+    assert [operation.op for operation in request.operations] == ["create", "update", "delete"]
+
+
+@pytest.mark.parametrize("operation", [
+    {"op": "delete", "note_id": 2 ** 31},
+    {"op": "archive", "note_id": 0},
+    {"op": "update", "note_id": 1, "title": "t", "description": "d", "tags": [99999999999]},
+    {"op": "create", "title": "t", "tags": [-1]},
+])
+def test_batch_rejects_ids_out_of_range(operation):
+    with pytest.raises(ValidationError):
+        NoteBatchRequest(operations=[operation])
+
+
+def test_note_requests_reject_tags_out_of_range():
+    with pytest.raises(ValidationError):
+        NoteCreateRequest(title="t", noteTags=[2 ** 31])
+    with pytest.raises(ValidationError):
+        NoteUpdateRequest(title="t", description="d", tags=[0])
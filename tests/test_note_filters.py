@@ -0,0 +1,26 @@
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("sqlalchemy")
+
+from fastapi import HTTPException
+
+from services.note import FILTER_MAX_TAGS, _parse_tags
+
+
+def test_parse_tags_deduplicates():
+    assert _parse_tags("3, 1,3,,") == [3, 1]
+    assert _parse_tags("") is None
+    assert _parse_tags(" , ") is None
+
+
+@pytest.mark.parametrize("tags", [
+    "1,abc",
+    "2147483648",
+    "99999999999",
+    ",".join(str(tag_id) for tag_id in range(FILTER_MAX_TAGS + 1)),
+])
+def test_malformed_tags_are_400(tags):
+    with pytest.raises(HTTPException) as error:
+        _parse_tags(tags)
+    assert error.value.status_code == 400
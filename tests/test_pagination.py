@@ -0,0 +1,45 @@
+import base64
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from fastapi import HTTPException
+
+from services.pagination import encode_cursor, decode_cursor, int32, int64, finite_float, timestamp
+
+
+def raw_cursor(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode()).decode().rstrip("=")
+
+
+def test_roundtrip():
+    created_at = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+    cursor = encode_cursor(0.25, created_at, 42)
+    assert decode_cursor(cursor, finite_float, timestamp, int32) == (0.25, created_at, 42)
+
+
+@pytest.mark.parametrize("cursor, converters", [
+    ("не base64", (int32,)),
+    (raw_cursor("{}"), (int32,)),
+    (raw_cursor("[1,2]"), (int32,)),
+    (raw_cursor("[2147483648]"), (int32,)),
+    (raw_cursor("[9223372036854775808]"), (int64,)),
+    (raw_cursor("[true]"), (int32,)),
+    (raw_cursor('["5"]'), (int32,)),
+    (raw_cursor("[1e400]"), (finite_float,)),
+    (raw_cursor("[" + "9" * 400 + "]"), (finite_float,)),
+    (raw_cursor('["inf"]'), (finite_float,)),
+    (raw_cursor("[NaN]"), (finite_float,)),
+    (raw_cursor("[123]"), (timestamp,)),
+    (raw_cursor('["вчера"]'), (timestamp,)),
+])
+def test_malformed_cursor_is_400(cursor, converters):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, *converters)
+    assert error.value.status_code == 400
+
+
+def test_int64_accepts_large_revisions():
+    assert decode_cursor(encode_cursor(2 ** 40, 7), int64, int32) == (2 ** 40, 7)
@@ -0,0 +1,60 @@
+"""Бюджеты SQL-запросов сервисных функций (замеры - benchmarks/query_budget.py).
+
+Нужна база из .env с примененными миграциями; без нее тесты пропускаются.
+"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("asyncpg")
+pytest.importorskip("fastapi")
+
+# Два размера: число запросов не должно зависеть от числа заметок
+SIZES = [10, 200]
+
+
+def _database_available() -> bool:
+    from pydantic import ValidationError
+    from sqlalchemy import text
+    from sqlalchemy.exc import SQLAlchemyError
+
+    try:
+        from database.database import engine
+    except ValidationError:  # нет .env и переменных окружения
+        return False
+
+    async def ping() -> bool:
+        try:
+            async with asyncio.timeout(5):
+                async with engine.connect() as connection:
+                    await connection.execute(text("SELECT 1"))
+            return True
+        except (OSError, SQLAlchemyError):
+            return False
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(ping())
+
+
+@pytest.fixture(scope="module")
+def by_size():
+    if not _database_available():
+        pytest.skip("база недоступна")
+    from benchmarks import query_budget
+    return asyncio.run(query_budget.collect(SIZES, seed_value=1))
+
+
+def test_every_budget_measured(by_size):
+    from benchmarks.query_budget import BUDGETS
+
+    for size, results in by_size.items():
+        assert set(BUDGETS) <= set(results), size
+
+
+def test_within_budgets(by_size):
+    from benchmarks.query_budget import find_violations
+
+    violations = find_violations(by_size)
+    assert not violations, violations
@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("pydantic_settings")
+
+from services.cache import InMemoryBackend, ResponseCache
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_lru_evicts_least_recently_used():
+    backend = InMemoryBackend(max_bytes=10)
+
+    async def scenario():
+        await backend.set("a", b"aaaa", 60)
+        await backend.set("b", b"bbbb", 60)
+        assert await backend.get("a") == b"aaaa"  # "a" становится самым свежим
+        await backend.set("c", b"cccc", 60)
+        return [await backend.get(key) for key in ("a", "b", "c")]
+
+    assert run(scenario()) == [b"aaaa", None, b"cccc"]
+    assert len(backend) == 2
+
+
+def test_value_larger_than_cache_is_not_stored():
+    backend = InMemoryBackend(max_bytes=4)
+
+    async def scenario():
+        await backend.set("a", b"aaaa", 60)
+        await backend.set("big", b"x" * 5, 60)
+        return await backend.get("a"), await backend.get("big")
+
+    assert run(scenario()) == (b"aaaa", None)
+
+
+def test_ttl_expiry():
+    backend = InMemoryBackend(max_bytes=100)
+
+    async def scenario():
+        await backend.set("fresh", b"1", 60)
+        await backend.set("stale", b"2", 0)
+        return await backend.get("fresh"), await backend.get("stale")
+
+    assert run(scenario()) == (b"1", None)
+    assert len(backend) == 1
+
+
+def test_replacing_key_keeps_size_accounting():
+    backend = InMemoryBackend(max_bytes=8)
+
+    async def scenario():
+        await backend.set("a", b"aaaa", 60)
+        await backend.set("a", b"aaaa", 60)
+        await backend.set("b", b"bbbb", 60)
+        return await backend.get("a"), await backend.get("b")
+
+    assert run(scenario()) == (b"aaaa", b"bbbb")
+
+
+def test_entries_are_keyed_by_etag():
+    cache = ResponseCache(local=InMemoryBackend(max_bytes=1024), shared=None, ttl=60)
+    loads = []
+
+    def loader(body: bytes):
+        async def load() -> bytes:
+            loads.append(body)
+            return body
+        return load
+
+    async def scenario():
+        first = await cache.get_or_load('"notes-1"', loader(b"v1"))
+        again = await cache.get_or_load('"notes-1"', loader(b"ignored"))
+        # Новая ревизия - новый ETag, старая запись не используется
+        changed = await cache.get_or_load('"notes-2"', loader(b"v2"))
+        return first, again, changed
+
+    assert run(scenario()) == (b"v1", b"v1", b"v2")
+    assert loads == [b"v1", b"v2"]
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_shared_level_fills_local():
+    shared = InMemoryBackend(max_bytes=1024)
+    local = InMemoryBackend(max_bytes=1024)
+    cache = ResponseCache(local=local, shared=shared, ttl=60)
+
+    async def loader() -> bytes:
+        raise AssertionError("значение есть в общем уровне")
+
+    async def scenario():
+        await shared.set("key", b"shared", 60)
+        return await cache.get_or_load("key", loader), await local.get("key")
+
+    assert run(scenario()) == (b"shared", b"shared")
+
+
+def test_concurrent_misses_share_one_load():
+    cache = ResponseCache(local=InMemoryBackend(max_bytes=1024), shared=None, ttl=60)
+    calls = 0
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def loader() -> bytes:
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return b"body"
+
+        waiters = [asyncio.create_task(cache.get_or_load("key", loader)) for _ in range(10)]
+        await asyncio.sleep(0)
+        release.set()
+        return await asyncio.gather(*waiters)
+
+    assert run(scenario()) == [b"body"] * 10
+    assert calls == 1
+
+
+def test_failed_load_is_not_cached():
+    cache = ResponseCache(local=InMemoryBackend(max_bytes=1024), shared=None, ttl=60)
+
+    async def failing() -> bytes:
+        raise RuntimeError("база недоступна")
+
+    async def working() -> bytes:
+        return b"body"
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await cache.get_or_load("key", failing)
+        return await cache.get_or_load("key", working)
+
+    assert run(scenario()) == b"body"
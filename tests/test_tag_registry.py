@@ -0,0 +1,50 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("sqlalchemy")
+
+from services import tag as tag_module
+from services.tag import TagRegistry
+
+
+@pytest.fixture
+def tags(monkeypatch):
+    """Таблица тегов в памяти; loads - число чтений справочника"""
+    now = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    state = SimpleNamespace(rows=[SimpleNamespace(id=1, name="Работа", color="#4682B4", created_at=now,
+                                                  updated_at=now)], loads=0)
+
+    async def find_all():
+        state.loads += 1
+        return list(state.rows)
+
+    monkeypatch.setattr(tag_module.TagCRUD, "find_all", find_all)
+    return state
+
+
+def test_unknown_id_reloads_once_per_interval(tags):
+    registry = TagRegistry(ttl=60, forced_reload_interval=60)
+
+    async def scenario():
+        assert 1 in await registry.resolve([1])
+        assert 999 not in await registry.resolve([999])
+        assert 999 not in await registry.resolve([999])
+
+    asyncio.run(scenario())
+    assert tags.loads == 2
+
+
+def test_tag_created_elsewhere_is_found(tags):
+    registry = TagRegistry(ttl=60, forced_reload_interval=60)
+
+    async def scenario():
+        await registry.get()
+        tags.rows.append(SimpleNamespace(id=2, name="Идеи", color="#FF69B4", created_at=tags.rows[0].created_at,
+                                         updated_at=tags.rows[0].updated_at))
+        return await registry.resolve([2])
+
+    assert asyncio.run(scenario())[2].name == "Идеи"
@@ -0,0 +1,62 @@
+import time
+
+import pytest
+
+pytest.importorskip("argon2")
+pytest.importorskip("jose")
+pytest.importorskip("pydantic_settings")
+
+import security
+from security import Principal, TokenCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Управляемые часы для TTL кэша"""
+    now = [1000.0]
+    monkeypatch.setattr(security.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_entry_expires_after_ttl(clock):
+    cache = TokenCache(max_size=10, ttl=30)
+    cache.set("token", Principal(id=1, is_admin=False))
+    clock[0] += 29
+    assert cache.get("token") == Principal(id=1, is_admin=False)
+    clock[0] += 1
+    assert cache.get("token") is None
+    assert len(cache) == 0
+
+
+def test_ttl_is_capped_by_token_expiry():
+    cache = TokenCache(max_size=10, ttl=300)
+    cache.set("expired", Principal(id=1, is_admin=False), expires_at=time.time() - 1)
+    assert cache.get("expired") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_is_evicted(clock):
+    cache = TokenCache(max_size=2, ttl=30)
+    cache.set("a", Principal(id=1, is_admin=False))
+    cache.set("b", Principal(id=2, is_admin=False))
+    assert cache.get("a") is not None  # "a" становится самым свежим
+    cache.set("c", Principal(id=3, is_admin=False))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_evict_user_drops_all_user_tokens(clock):
+    cache = TokenCache(max_size=10, ttl=30)
+    cache.set("phone", Principal(id=1, is_admin=True))
+    cache.set("laptop", Principal(id=1, is_admin=True))
+    cache.set("other", Principal(id=2, is_admin=False))
+    cache.evict_user(1)
+    assert cache.get("phone") is None and cache.get("laptop") is None
+    assert cache.get("other") == Principal(id=2, is_admin=False)
+    assert len(cache) == 1
+
+
+def test_token_is_not_stored_in_clear(clock):
+    cache = TokenCache(max_size=10, ttl=30)
+    cache.set("secret-token", Principal(id=1, is_admin=False))
+    assert "secret-token" not in cache._entries